@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+"""Compare gateway calls per second with and without connection pooling
+
+Starts a local stand-in for the Pyon HTTP gateway and issues the same
+call repeatedly, first with a bare requests.post per call (the way
+PyonHTTPGateWayCeiConnection used to work), then through the pooled
+session of PyonHTTPGateWayCeiConnection.
+
+    python benchmarks/gateway_pool.py [-n CALLS]
+"""
+
+import argparse
+import json
+import threading
+import time
+
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+
+import requests
+
+from ceiclient.connection import PyonHTTPGateWayCeiConnection
+
+RESPONSE = json.dumps({'data': {'GatewayResponse': {'state': '500-RUNNING'}}})
+
+
+class GatewayHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    # Send each response in one write so keep-alive connections aren't
+    # stalled by Nagle's algorithm against the client's delayed ACKs
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.getheader('Content-Length', 0)))
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(RESPONSE)))
+        self.end_headers()
+        self.wfile.write(RESPONSE)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class GatewayServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def unpooled_call(conn, service, operation, **kwargs):
+    url = conn._make_url(service, operation)
+    params = conn._make_parameters(service, operation, kwargs)
+    return requests.post(url, data=params).json()['data']['GatewayResponse']
+
+
+def measure(label, func, calls):
+    start = time.time()
+    for i in range(calls):
+        func()
+    elapsed = time.time() - start
+    print "%-10s %6d calls in %6.2fs  %8.1f calls/s" % (label, calls, elapsed, calls / elapsed)
+    return calls / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', dest='calls', type=int, default=2000)
+    opts = parser.parse_args()
+
+    server = GatewayServer(('127.0.0.1', 0), GatewayHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    conn = PyonHTTPGateWayCeiConnection('127.0.0.1', port=server.server_address[1], timeout=5)
+    try:
+        before = measure('unpooled', lambda: unpooled_call(conn, 'process_dispatcher', 'read_process',
+            process_id='p1'), opts.calls)
+        after = measure('pooled', lambda: conn.call('process_dispatcher', 'read_process',
+            process_id='p1'), opts.calls)
+        print "speedup    %.2fx" % (after / before)
+    finally:
+        conn.disconnect()
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
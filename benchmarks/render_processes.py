@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+"""Time rendering process listings with and without the template registry
+
+Renders the 'process list' output template for N fake processes split
+into CALLS listings, as CALLS 'process list' commands run in one ceictl
+shell or script would. The template is first compiled once per listing,
+as output() did before the registry, then taken from
+ceiclient.commands._template, which compiles it once for all listings.
+Output is discarded so only rendering is measured.
+
+    python benchmarks/render_processes.py [-n PROCESSES] [--calls CALLS]
+"""
+
+import argparse
+import time
+
+from jinja2 import Template
+
+from ceiclient.commands import PDDescribeProcess, PDDescribeProcesses, _template
+
+
+def make_processes(count):
+    return [{'upid': 'proc-%d' % i, 'name': 'worker-%d' % i, 'state': '500-RUNNING',
+             'hostname': 'vm-%d.example.com' % (i % 100), 'assigned': 'eeagent-%d' % (i % 100)}
+            for i in xrange(count)]
+
+
+def render_compiled_per_call(listings):
+    for processes in listings:
+        template = Template(PDDescribeProcesses.output_template)
+        for process in processes:
+            process = PDDescribeProcess.extract_details(process)
+            template.render(result=process)
+
+
+def render_cached(listings):
+    for processes in listings:
+        template = _template(PDDescribeProcesses.output_template)
+        for process in processes:
+            process = PDDescribeProcess.extract_details(process)
+            template.render(result=process)
+
+
+def measure(label, func, listings):
+    count = sum(len(processes) for processes in listings)
+    start = time.time()
+    func(listings)
+    elapsed = time.time() - start
+    print "%-10s %6d processes in %5d listings in %6.2fs  %8.1f processes/s" % (
+        label, count, len(listings), elapsed, count / elapsed)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', dest='count', type=int, default=50000)
+    parser.add_argument('--calls', type=int, default=1)
+    opts = parser.parse_args()
+
+    processes = make_processes(opts.count)
+    size = max(1, opts.count // opts.calls)
+    listings = [processes[i:i + size] for i in xrange(0, opts.count, size)]
+    before = measure('per call', render_compiled_per_call, listings)
+    after = measure('cached', render_cached, listings)
+    print "speedup    %.2fx" % (before / after)
+
+
+if __name__ == '__main__':
+    main()
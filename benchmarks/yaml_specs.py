@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+"""Time loading process specification files with each YAML loader
+
+Writes N process definition files to a temporary directory and loads all
+of them, first with PyYAML's pure Python SafeLoader, then through
+ceiclient.yamlio (the libyaml CSafeLoader when PyYAML was built with it).
+
+    python benchmarks/yaml_specs.py [-n FILES]
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import yaml
+
+from ceiclient import yamlio
+
+
+def make_definition(i):
+    return {
+        'name': 'worker-%d' % i,
+        'description': 'Benchmark worker number %d' % i,
+        'executable': {
+            'exec': '/usr/bin/worker',
+            'argv': ['--id', str(i), '--queue', 'work-%d' % (i % 16)],
+            'module': 'workers.benchmark',
+            'class': 'Worker',
+        },
+        'configuration': {
+            'worker': {'threads': i % 8 + 1, 'timeout': 30.5, 'tags': ['a', 'b', 'c']},
+            'logging': {'level': 'INFO', 'handlers': ['console', 'file']},
+            'env': dict(('VAR_%d' % j, 'value-%d' % j) for j in range(20)),
+        },
+    }
+
+
+def write_specs(directory, count):
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, 'worker-%d.yml' % i)
+        with open(path, 'w') as f:
+            yaml.safe_dump(make_definition(i), f, default_flow_style=False)
+        paths.append(path)
+    return paths
+
+
+def measure(label, load, paths):
+    start = time.time()
+    for path in paths:
+        with open(path) as f:
+            load(f)
+    elapsed = time.time() - start
+    print "%-10s %6d files in %6.2fs  %8.1f files/s" % (label, len(paths), elapsed, len(paths) / elapsed)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', dest='count', type=int, default=500)
+    opts = parser.parse_args()
+
+    if not yamlio.using_libyaml():
+        print "PyYAML was built without libyaml; both runs use the pure Python loader"
+
+    directory = tempfile.mkdtemp()
+    try:
+        paths = write_specs(directory, opts.count)
+        before = measure('python', lambda f: yaml.load(f, Loader=yaml.SafeLoader), paths)
+        after = measure('yamlio', yamlio.load, paths)
+        print "speedup    %.2fx" % (before / after)
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
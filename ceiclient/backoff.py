@@ -0,0 +1,67 @@
+import random
+import time
+
+from ceiclient.exception import WaitTimeoutError
+
+DEFAULT_MAX_INTERVAL = 10.0
+DEFAULT_MULTIPLIER = 2.0
+DEFAULT_JITTER = 0.5
+
+
+class Backoff(object):
+    """Exponentially growing intervals between attempts
+
+    Intervals start at initial and are multiplied by multiplier after each
+    attempt, up to max_interval. Each one is then reduced by a random
+    fraction of up to jitter, so that many clients started at the same
+    time don't keep hitting a service in lockstep.
+    """
+
+    def __init__(self, initial, max_interval=DEFAULT_MAX_INTERVAL,
+            multiplier=DEFAULT_MULTIPLIER, jitter=DEFAULT_JITTER):
+        if initial < 0:
+            raise ValueError("initial interval must not be negative")
+        if not 0 <= jitter <= 1:
+            raise ValueError("jitter must be between 0 and 1")
+        self.initial = initial
+        self.max_interval = max(initial, max_interval)
+        self.multiplier = multiplier
+        self.jitter = jitter
+
+    def intervals(self):
+        interval = self.initial
+        while True:
+            yield interval * (1 - self.jitter * random.random())
+            interval = min(interval * self.multiplier, self.max_interval)
+
+
+def wait_for(check, max_wait, backoff, timeout_message, wait=None):
+    """Call check until it returns something other than None, and return that
+
+    check is retried at the intervals given by backoff until max_wait
+    seconds have passed, at which point WaitTimeoutError(timeout_message)
+    (a CeiClientError) is raised; timeout_message can also be a function returning the message.
+    check can raise to stop waiting early.
+
+    wait is called with the number of seconds to wait between checks, and
+    defaults to time.sleep. If it returns something other than None (for
+    example because a notification arrived) that is returned right away.
+    """
+    if wait is None:
+        wait = time.sleep
+
+    deadline = time.time() + max_wait
+    for interval in backoff.intervals():
+        result = check()
+        if result is not None:
+            return result
+
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            if callable(timeout_message):
+                timeout_message = timeout_message()
+            raise WaitTimeoutError(timeout_message)
+
+        result = wait(min(interval, remaining))
+        if result is not None:
+            return result
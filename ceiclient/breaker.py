@@ -0,0 +1,124 @@
+import threading
+import time
+
+from ceiclient.exception import CircuitOpenError
+from ceiclient.retry import is_transient
+
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = 30
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class CircuitBreaker(object):
+    """Fails calls to a service fast while it appears to be down
+
+    After failure_threshold consecutive failed calls the circuit opens, and
+    calls raise CircuitOpenError without being sent. Once reset_timeout
+    seconds have passed, it is half-open: one call is let through as a
+    probe, closing the circuit if it succeeds and opening it again if not.
+    A probe that hasn't finished after another reset_timeout seconds is
+    given up on, and the next call is let through as a new one.
+    """
+
+    def __init__(self, name, failure_threshold=DEFAULT_FAILURE_THRESHOLD,
+            reset_timeout=DEFAULT_RESET_TIMEOUT, clock=time.time):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = CLOSED
+        self.failures = 0
+        self._opened_at = None
+        self._probe_started = None
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may be made now
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            now = self.clock()
+            if (self.state == OPEN and now - self._opened_at >= self.reset_timeout) or \
+                    (self.state == HALF_OPEN and now - self._probe_started >= self.reset_timeout):
+                self.state = HALF_OPEN
+                self._probe_started = now
+                return
+            raise CircuitOpenError("%s is unavailable after %d failed calls, not calling it for %ds" % (
+                self.name, self.failures, max(0, self._opened_at + self.reset_timeout - self.clock())))
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = OPEN
+                self._opened_at = self.clock()
+
+    def record_abort(self):
+        """Record a call that ended without an outcome (e.g. KeyboardInterrupt)
+
+        If it was the probe, the next call is let through as a new one.
+        """
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self.state = OPEN
+
+
+class CircuitBreakers(object):
+    """One CircuitBreaker per service, created as services are called
+
+    A call fails, for its breaker, if it raises an error accepted by
+    is_failure: by default the errors meaning the service couldn't be
+    reached or didn't reply. Other errors show the service is up.
+
+    Connections share one of these when given the same instance, so that
+    all of an application's connections stop calling a dead service.
+    """
+
+    def __init__(self, failure_threshold=DEFAULT_FAILURE_THRESHOLD,
+            reset_timeout=DEFAULT_RESET_TIMEOUT, is_failure=is_transient, clock=time.time):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.is_failure = is_failure
+        self.clock = clock
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, service):
+        with self._lock:
+            breaker = self._breakers.get(service)
+            if breaker is None:
+                breaker = self._breakers[service] = CircuitBreaker(service,
+                        self.failure_threshold, self.reset_timeout, clock=self.clock)
+            return breaker
+
+    def call(self, func, service, operation, kwargs):
+        """Return func(service, operation, **kwargs) unless service's circuit is open
+        """
+        breaker = self.breaker(service)
+        breaker.before_call()
+        succeeded = None
+        try:
+            result = func(service, operation, **kwargs)
+            succeeded = True
+            return result
+        except Exception as e:
+            succeeded = not self.is_failure(e)
+            raise
+        finally:
+            # Also reached on BaseExceptions such as KeyboardInterrupt,
+            # which mustn't leave the circuit half-open for good
+            if succeeded is None:
+                breaker.record_abort()
+            elif succeeded:
+                breaker.record_success()
+            else:
+                breaker.record_failure()
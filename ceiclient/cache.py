@@ -0,0 +1,191 @@
+import copy
+import json
+import threading
+import time
+
+from collections import OrderedDict
+
+DEFAULT_CACHE_SIZE = 1024
+DEFAULT_TTL = 30
+
+# Read operations whose replies rarely change, by the operation name sent
+# to the service, with the number of seconds their replies are kept
+DEFAULT_TTLS = {
+    'describe_dt': DEFAULT_TTL,
+    'describe_site': DEFAULT_TTL,
+    'list_sites': DEFAULT_TTL,
+    'describe_domain_definition': DEFAULT_TTL,
+    'describe_definition': DEFAULT_TTL,
+    'read_process_definition': DEFAULT_TTL,
+}
+
+MUTATING_PREFIXES = ('add_', 'update_', 'remove_', 'create_', 'delete_')
+
+
+class TTLCache(object):
+    """Bounded mapping whose entries expire ttl seconds after being set
+
+    Once maxsize entries are stored, setting another one evicts the least
+    recently used.
+    """
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE, clock=time.time):
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self.maxsize = maxsize
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None or entry[0] <= self.clock():
+                self.misses += 1
+                return default
+            self._entries[key] = entry
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries.pop(key, None)
+            while len(self._entries) >= self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._entries[key] = (self.clock() + ttl, value)
+
+    def invalidate(self, predicate):
+        """Drop the entries whose key matches predicate(key)
+        """
+        with self._lock:
+            for key in [k for k in self._entries if predicate(k)]:
+                del self._entries[key]
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+class CachingConnection(object):
+    """Connection wrapper caching the replies of read operations
+
+    Any client can be given one in place of its connection:
+
+        dtrs = DTRSClient(CachingConnection(connection))
+
+    Replies to the operations in ttls are kept for that many seconds.
+    A mutating call (add_*, update_*, remove_*, create_*, delete_*) to a
+    service drops its cached replies, except those that were for a
+    different object: same argument name, different value (for example
+    a dt_name other than the one updated). Replies are dropped once the
+    mutating call returns, and replies to reads that overlapped a mutating
+    call aren't cached, since they may predate it. Everything else is
+    passed through to the wrapped connection.
+    """
+
+    def __init__(self, connection, ttls=None, maxsize=DEFAULT_CACHE_SIZE, clock=time.time):
+        self.connection = connection
+        self.ttls = DEFAULT_TTLS if ttls is None else ttls
+        self.cache = TTLCache(maxsize, clock=clock)
+        # Number of mutating calls started and finished so far, and of
+        # those in flight: a read is only cached if neither changed
+        # while it was made
+        self._mutations = 0
+        self._mutations_in_flight = 0
+        self._lock = threading.Lock()
+
+    def _mutation_state(self):
+        with self._lock:
+            return self._mutations, self._mutations_in_flight
+
+    def __getattr__(self, name):
+        return getattr(self.connection, name)
+
+    def call(self, service, operation, **kwargs):
+        ttl = self.ttls.get(operation)
+        if ttl is not None:
+            key = (service, operation, _freeze(kwargs))
+            result = self.cache.get(key, _MISSING)
+            if result is _MISSING:
+                before = self._mutation_state()
+                result = self.connection.call(service, operation, **kwargs)
+                if before[1] == 0 and self._mutation_state() == before:
+                    self.cache.set(key, copy.deepcopy(result), ttl)
+                return result
+            return copy.deepcopy(result)
+
+        if not operation.startswith(MUTATING_PREFIXES):
+            return self.connection.call(service, operation, **kwargs)
+
+        with self._lock:
+            self._mutations += 1
+            self._mutations_in_flight += 1
+        try:
+            return self.connection.call(service, operation, **kwargs)
+        finally:
+            # Dropped after the call, so that a read made while it was in
+            # flight can't put the old reply back for a whole TTL
+            self.invalidate(service, **_flatten(kwargs))
+            with self._lock:
+                self._mutations_in_flight -= 1
+
+    def call_async(self, service, operation, **kwargs):
+        return self.submit(self.call, service, operation, **kwargs)
+
+    def invalidate(self, service, **kwargs):
+        """Drop the cached replies of service that may involve kwargs
+        """
+        def matches(key):
+            key_service, _, frozen = key
+            if key_service != service:
+                return False
+            cached = dict(frozen)
+            return all(cached[name] == _freeze_value(value)
+                    for name, value in kwargs.items() if name in cached)
+        self.cache.invalidate(matches)
+
+    def stats(self):
+        return self.cache.stats()
+
+
+_MISSING = object()
+
+
+def _freeze_value(value):
+    if isinstance(value, (dict, list, tuple)):
+        return json.dumps(value, sort_keys=True, default=repr)
+    return value
+
+
+def _freeze(kwargs):
+    return tuple(sorted((name, _freeze_value(value)) for name, value in kwargs.items()))
+
+
+def _flatten(kwargs):
+    """Merge a nested args dict (as sent by PDClient) into kwargs
+    """
+    args = kwargs.get('args')
+    if not isinstance(args, dict):
+        return kwargs
+    flat = dict(args)
+    flat.update((name, value) for name, value in kwargs.items() if name != 'args')
+    return flat
@@ -2,16 +2,13 @@
 
 import argparse
 import sys
-
-from dashi.exceptions import NotFoundError, WriteConflictError
-import json
-import yaml
+import types
 
 import ceiclient
 from ceiclient.exception import CeiClientError
 from ceiclient.commands import DASHI_SERVICES, PYON_SERVICES, PYON_GATEWAY_SERVICES
-from ceiclient.connection import DashiCeiConnection, PyonCeiConnection, PyonHTTPGateWayCeiConnection
 from ceiclient.common import safe_print
+from ceiclient.formatters import FORMATS, format_ndjson, write_chunked, write_rows
 
 DEFAULT_RABBITMQ_USERNAME = 'guest'
 DEFAULT_RABBITMQ_PASSWORD = 'guest'
@@ -21,64 +18,162 @@ DEFAULT_TIMEOUT = 5
 DEFAULT_GATEWAY_HOSTNAME = 'localhost'
 DEFAULT_GATEWAY_PORT = 5001
 
+SHELL = 'shell'
+SCRIPT = 'script'
+SHELL_PROMPT = 'ceictl> '
+
 
-def using_pyon():
+def using_pyon(argv=None):
     """Peek into argv to see if user wants to use pyon or not
     """
-    return '-P' in sys.argv or '--pyon' in sys.argv
+    if argv is None:
+        argv = sys.argv
+    return '-P' in argv or '--pyon' in argv
 
 
-def using_pyon_gateway():
+def using_pyon_gateway(argv=None):
     """Peek into argv to see if user wants to use pyon gateway or not
     """
-    return '-G' in sys.argv or '--pyon-gateway' in sys.argv
-
-parser = argparse.ArgumentParser(description='Client to control CEI services')
-
-parser.add_argument('--broker', '-b', action='store', dest='broker')
-parser.add_argument('--exchange', '-x', action='store', dest='exchange', default=None)
-parser.add_argument('--username', '-u', action='store', dest='username')
-parser.add_argument('--password', '-p', action='store', dest='password')
-parser.add_argument('--timeout', '-t', action='store', dest='timeout', type=int, default=DEFAULT_TIMEOUT)
-parser.add_argument('--yaml', '-Y', action='store_const', const=True)
-parser.add_argument('--json', '-J', action='store_const', const=True)
-parser.add_argument('--details', '-D', action='store_const', const=True)
-parser.add_argument('--run-name', '-n', action='store', dest='run_name')
-parser.add_argument('--service-name', '-d', action='store', default=None)
-parser.add_argument('--sysname', '-s', action='store', default=None)
-parser.add_argument('--caller', '-c', action='store', dest='caller', default=None)
-parser.add_argument('--pyon', '-P', action='store_const', const=True)
-parser.add_argument('--pyon-gateway', '-G', action='store_const', const=True)
-parser.add_argument('--gateway-port', '-R', action='store', default=None)
-parser.add_argument('--gateway-host', '-H', action='store', default=None)
-
-if using_pyon():
-    SERVICES = PYON_SERVICES
-elif using_pyon_gateway():
-    SERVICES = PYON_GATEWAY_SERVICES
-else:
-    SERVICES = DASHI_SERVICES
-
-subparsers = parser.add_subparsers(dest='service', help='Service to which to send a command')
-
-for service_name, service in SERVICES.items():
-    service_parser = subparsers.add_parser(service_name)
-    service_subparsers = service_parser.add_subparsers(dest='command', help='Command to send to the service')
-    for command_name, command in service.commands.items():
-        command(service_subparsers)
-
-opts = parser.parse_args()
-
-
-def main():
-    if opts.service not in SERVICES:
-        raise ValueError('Service %s is not supported' % opts.service)
+    if argv is None:
+        argv = sys.argv
+    return '-G' in argv or '--pyon-gateway' in argv
 
-    service = SERVICES[opts.service]
 
-    if opts.command not in service.commands:
-        raise ValueError('Command %s is not supported by service %s' % (opts.command, opts.service))
+def get_services(argv=None):
+    if using_pyon(argv):
+        return PYON_SERVICES
+    elif using_pyon_gateway(argv):
+        return PYON_GATEWAY_SERVICES
+    else:
+        return DASHI_SERVICES
+
+
+def add_global_arguments(parser):
+    parser.add_argument('--broker', '-b', action='store', dest='broker')
+    parser.add_argument('--exchange', '-x', action='store', dest='exchange', default=None)
+    parser.add_argument('--username', '-u', action='store', dest='username')
+    parser.add_argument('--password', '-p', action='store', dest='password')
+    parser.add_argument('--timeout', '-t', action='store', dest='timeout', type=int, default=DEFAULT_TIMEOUT)
+    parser.add_argument('--yaml', '-Y', action='store_const', const=True)
+    parser.add_argument('--json', '-J', action='store_const', const=True)
+    parser.add_argument('--details', '-D', action='store_const', const=True)
+    parser.add_argument('--ndjson', action='store_const', const=True,
+            help='Print each element of a listing as one line of JSON, as it is received')
+    parser.add_argument('--format', choices=FORMATS, default=None,
+            help='Show listings as a table, tab separated values or one JSON object per line')
+    parser.add_argument('--run-name', '-n', action='store', dest='run_name')
+    parser.add_argument('--service-name', '-d', action='store', default=None)
+    parser.add_argument('--sysname', '-s', action='store', default=None)
+    parser.add_argument('--caller', '-c', action='store', dest='caller', default=None)
+    parser.add_argument('--pyon', '-P', action='store_const', const=True)
+    parser.add_argument('--pyon-gateway', '-G', action='store_const', const=True)
+    parser.add_argument('--gateway-port', '-R', action='store', default=None)
+    parser.add_argument('--gateway-host', '-H', action='store', default=None)
+    parser.add_argument('--timings', action='store_true', default=False,
+            help='Print how long calls to each service operation took (p50/p95/p99) at exit')
+    parser.add_argument('--file', '-f', action='store', dest='script', default=None, metavar='SCRIPT',
+            help='Run the commands in SCRIPT (one per line, - for stdin) over a single connection')
+
+
+class _PeekError(Exception):
+    pass
+
+
+class _PeekParser(argparse.ArgumentParser):
+    """Parser that raises instead of printing usage and exiting
+    """
+
+    def error(self, message):
+        raise _PeekError(message)
+
+
+def _peek(argv):
+    """Parse the global options of argv, leaving the rest in opts.rest
+
+    Returns None if the global options are invalid.
+    """
+    parser = _PeekParser(add_help=False)
+    add_global_arguments(parser)
+    parser.add_argument('rest', nargs=argparse.REMAINDER)
+    try:
+        opts, _ = parser.parse_known_args(argv)
+    except _PeekError:
+        return None
+    return opts
+
+
+def requested_session(argv):
+    """Find whether argv asks for the shell or for a script to be run
+
+    Returns the global options argv starts with, and SHELL, SCRIPT or None.
+    """
+    opts = _peek(argv)
+    if opts is None:
+        return argv, None
+    prefix = argv[:len(argv) - len(opts.rest)]
+
+    if opts.rest == [SHELL]:
+        return prefix, SHELL
+    if opts.script and not opts.rest:
+        return prefix, SCRIPT
+    if opts.script:
+        raise CeiClientError("--file can't be combined with a command")
+    return prefix, None
+
 
+def requested_command(services, argv):
+    """Find the service and command names requested in argv
+
+    Either may be None when argv doesn't name a known one (for example when
+    asking for --help), in which case all of them need to be registered.
+    """
+    opts = _peek(argv)
+    if opts is None:
+        return None, None
+
+    if not opts.rest or opts.rest[0] not in services:
+        return None, None
+    service_name = opts.rest[0]
+
+    if len(opts.rest) < 2 or opts.rest[1] not in services[service_name].commands:
+        return service_name, None
+    return service_name, opts.rest[1]
+
+
+def build_parser(services, argv):
+    """Build the ceictl argument parser
+
+    Building subparsers for every command of every service is a large part
+    of ceictl's startup time, so only the service and command requested in
+    argv are registered. Everything is registered when argv doesn't
+    identify a single command, so that --help and usage errors list all
+    the choices.
+    """
+    wanted_service, wanted_command = requested_command(services, argv)
+
+    parser = argparse.ArgumentParser(description='Client to control CEI services')
+    add_global_arguments(parser)
+
+    subparsers = parser.add_subparsers(dest='service', help='Service to which to send a command')
+    if wanted_service is None:
+        subparsers.add_parser(SHELL, help='Read commands interactively and run them over a single connection')
+
+    for service_name, service in services.items():
+        if wanted_service is not None and service_name != wanted_service:
+            continue
+        service_parser = subparsers.add_parser(service_name)
+        service_subparsers = service_parser.add_subparsers(dest='command', help='Command to send to the service')
+        for command_name, command in service.commands.items():
+            if wanted_command is not None and command_name != wanted_command:
+                continue
+            command(service_subparsers)
+
+    return parser
+
+
+def load_settings(opts):
+    """Work out connection settings from defaults, cloudinit.d and opts
+    """
     amqp_settings = {}
 
     # Set default amqp settings (for localhost testing)
@@ -110,43 +205,239 @@ def main():
         amqp_settings['coi_services_system_name'] = opts.sysname
         amqp_settings['dashi_sysname'] = opts.sysname
 
+    return amqp_settings
+
+
+def connect(opts):
+    conn = _connect(opts)
+    if opts.timings:
+        from ceiclient.instrumentation import HistogramCollector
+        conn.timings = HistogramCollector()
+        conn.add_instrument(conn.timings)
+    return conn
+
+
+def print_timings(collector, stream=None):
+    """Print a table of call counts and latency percentiles per operation
+    """
+    if stream is None:
+        stream = sys.stderr
+
+    def ms(seconds):
+        return "%.1f" % (seconds * 1000)
+
+    rows = [('SERVICE', 'OPERATION', 'CALLS', 'ERRORS', 'P50 MS', 'P95 MS', 'P99 MS')]
+    for service, operation, calls, errors, percentiles in collector.summary():
+        rows.append((service, operation, str(calls), str(errors)) + tuple(ms(p) for p in percentiles))
+
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    for row in rows:
+        print >> stream, "  ".join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip()
+
+
+def disconnect(conn, opts):
+    conn.disconnect()
+    if opts.timings:
+        print_timings(conn.timings)
+
+
+def _connect(opts):
+    amqp_settings = load_settings(opts)
+
+    # The transports pull in dashi, kombu and requests, so they are only
+    # imported once we know which one is needed
     if opts.pyon:
-        conn = PyonCeiConnection(amqp_settings['rabbitmq_host'],
+        from ceiclient.connection import PyonCeiConnection
+        return PyonCeiConnection(amqp_settings['rabbitmq_host'],
                 amqp_settings['rabbitmq_username'],
                 amqp_settings['rabbitmq_password'],
                 sysname=amqp_settings.get('coi_services_system_name'),
                 timeout=opts.timeout)
-        client = service.client(conn, service_name=opts.service_name)
     elif opts.pyon_gateway:
-        conn = PyonHTTPGateWayCeiConnection(amqp_settings['gateway_host'],
+        from ceiclient.connection import PyonHTTPGateWayCeiConnection
+        return PyonHTTPGateWayCeiConnection(amqp_settings['gateway_host'],
                 port=amqp_settings.get('gateway_port', DEFAULT_GATEWAY_PORT),
                 timeout=opts.timeout)
-        client = service.client(conn, dashi_name=opts.service_name)
     else:
-        conn = DashiCeiConnection(amqp_settings['rabbitmq_host'],
+        from ceiclient.connection import DashiCeiConnection
+        return DashiCeiConnection(amqp_settings['rabbitmq_host'],
                 amqp_settings['rabbitmq_username'],
                 amqp_settings['rabbitmq_password'],
                 exchange=amqp_settings['rabbitmq_exchange'],
                 timeout=opts.timeout,
                 sysname=amqp_settings.get('dashi_sysname'))
+
+
+def run_command(services, conn, opts):
+    """Run the command selected by opts over conn and print its result
+    """
+    if opts.service not in services:
+        raise ValueError('Service %s is not supported' % opts.service)
+
+    service = services[opts.service]
+
+    if opts.command not in service.commands:
+        raise ValueError('Command %s is not supported by service %s' % (opts.command, opts.service))
+
+    if opts.pyon:
+        client = service.client(conn, service_name=opts.service_name)
+    else:
         client = service.client(conn, dashi_name=opts.service_name)
 
+    from dashi.exceptions import NotFoundError, WriteConflictError
+
     command = service.commands[opts.command]
+    columns = getattr(command, 'columns', None)
+    if opts.format and columns is None:
+        raise CeiClientError("--format isn't supported by '%s %s'" % (opts.service, opts.command))
+
+    # Listings may be generated as they are printed, so errors from the
+    # service can also come up while printing
     try:
         result = command.execute(client, opts)
+        result = print_result(command, columns, result, opts)
     except (NotFoundError, WriteConflictError) as e:
         raise CeiClientError(e.value)
 
-    if opts.yaml:
-        safe_print(yaml.safe_dump(result, default_flow_style=False)),
+    failure = command.failed(result)
+    if failure:
+        raise CeiClientError(failure)
+
+
+def print_result(command, columns, result, opts):
+    """Print the result of command in the output format chosen in opts
+
+    Returns the result, as a list if a generated one was dumped whole.
+    """
+    if (opts.yaml or opts.json) and not (opts.format or opts.ndjson) and \
+            isinstance(result, types.GeneratorType):
+        # listings can be generated as they are printed, but are dumped whole
+        result = list(result)
+
+    if opts.format:
+        write_rows(result, columns, opts.format)
+    elif opts.ndjson:
+        write_chunked(format_ndjson(result))
+    elif opts.yaml:
+        from ceiclient import yamlio
+        safe_print(yamlio.dump(result, default_flow_style=False)),
     elif opts.json:
+        import json
         safe_print(json.dumps(result, indent=4)),
     elif opts.details:
         command.details(result)
     else:
         command.output(result)
 
-    conn.disconnect()
+def read_script(path):
+    """Yield (line number, line) for each line of a script file, or stdin for -
+    """
+    if path == '-':
+        for lineno, line in enumerate(sys.stdin, 1):
+            yield lineno, line
+        return
+    try:
+        f = open(path)
+    except IOError as e:
+        raise CeiClientError("Problem reading script %s: %s" % (path, e))
+    with f:
+        for lineno, line in enumerate(f, 1):
+            yield lineno, line
+
+
+def read_shell():
+    """Yield (line number, line) for each line typed in the shell
+    """
+    try:
+        import readline  # noqa, gives raw_input line editing and history
+    except ImportError:
+        pass
+
+    prompt = SHELL_PROMPT if sys.stdin.isatty() else ''
+    lineno = 0
+    while True:
+        try:
+            line = raw_input(prompt)
+        except EOFError:
+            if prompt:
+                print
+            return
+        lineno += 1
+        yield lineno, line
+
+
+def run_session(services, conn, prefix, lines, source, interactive=False):
+    """Run one command per line over a single connection
+
+    Each line is a ceictl command line without the program name, parsed as
+    if prefix (the global options ceictl was started with) came first. In a
+    script, the first failing line stops the session; in the interactive
+    shell, errors are printed and the next command is read.
+    """
+    import shlex
+
+    for lineno, line in lines:
+        try:
+            args = shlex.split(line, comments=True)
+        except ValueError as e:
+            error = str(e)
+        else:
+            if not args:
+                continue
+            if interactive and args[0] in ('exit', 'quit'):
+                return
+
+            argv = prefix + args
+            try:
+                opts = build_parser(services, argv).parse_args(argv)
+                run_command(services, conn, opts)
+                continue
+            except SystemExit as e:
+                # argparse already printed usage or help
+                if not e.code:
+                    continue
+                error = "invalid command"
+            except (CeiClientError, ValueError) as e:
+                error = str(e)
+            except Exception as e:
+                if not interactive:
+                    raise
+                error = "%s: %s" % (e.__class__.__name__, e)
+
+        if not interactive:
+            raise CeiClientError("%s, line %d: %s" % (source, lineno, error))
+        print >> sys.stderr, "Error: %s" % error
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+
+    services = get_services(argv)
+
+    prefix, session = requested_session(argv)
+    if session is None:
+        opts = build_parser(services, argv).parse_args(argv)
+        conn = connect(opts)
+        try:
+            run_command(services, conn, opts)
+        finally:
+            disconnect(conn, opts)
+        return
+
+    global_parser = argparse.ArgumentParser(prog='ceictl')
+    add_global_arguments(global_parser)
+    opts = global_parser.parse_args(prefix)
+
+    conn = connect(opts)
+    try:
+        if session == SHELL:
+            run_session(services, conn, prefix, read_shell(), 'shell', interactive=True)
+        else:
+            run_session(services, conn, prefix, read_script(opts.script), opts.script)
+    finally:
+        disconnect(conn, opts)
+
 
 def start():
     try:
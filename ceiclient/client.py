@@ -1,6 +1,55 @@
 import uuid
 
-from ceiclient.exception import CeiClientError
+from ceiclient.exception import CeiClientError, OperationNotSupportedError
+
+
+def _iter_reply(reply):
+    """Yield the entries of a list reply, letting go of each once yielded
+
+    A consumer handling them one at a time then doesn't hold both the whole
+    reply and everything it made of it. A None reply has no entries.
+    """
+    if reply is None:
+        return
+    if not isinstance(reply, list):
+        for entry in reply:
+            yield entry
+        return
+    reply.reverse()
+    while reply:
+        yield reply.pop()
+
+
+class AsyncClient(object):
+    """Asynchronous variant of a client
+
+    Calling any method of the wrapped client starts it on the client's
+    connection (see CeiConnection.submit) and returns a
+    ceiclient.concurrency.Future for its result:
+
+        pd = AsyncClient(PDClient(connection))
+        futures = [pd.describe_process(upid) for upid in upids]
+        processes = gather(futures).result()
+
+    Any number of calls can be started this way; they share the
+    connection's bounded worker pool rather than each taking a thread.
+    Results can be handled as they arrive with Future.add_done_callback
+    or ceiclient.concurrency.as_completed.
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    def __getattr__(self, name):
+        method = getattr(self.client, name)
+        if not callable(method) or name.startswith('_'):
+            return method
+
+        def call_async(*args, **kwargs):
+            return self.client.connection.submit(method, *args, **kwargs)
+        call_async.__name__ = name
+        call_async.__doc__ = method.__doc__
+        return call_async
 
 
 class DashiCeiClient(object):
@@ -270,7 +319,7 @@ class PyonHTTPPDClient(PyonHTTPGatewayCeiClient):
                 'delete_process_definition', process_definition_id=process_definition_id)
 
     def list_process_definitions(self):
-        raise CeiClientError("The Pyon PD does not support listing process definitions")
+        raise OperationNotSupportedError("The Pyon PD does not support listing process definitions")
 
     def schedule_process(self, upid, process_definition_id=None,
             process_definition_name=None, configuration=None,
@@ -314,12 +363,18 @@ class PyonHTTPPDClient(PyonHTTPGatewayCeiClient):
     def describe_processes(self):
         return self.connection.call(self.dashi_name, 'list_processes')
 
+    def iter_processes(self):
+        """Yield processes one at a time, see PDClient.iter_processes
+        """
+        for process in _iter_reply(self.describe_processes()):
+            yield process
+
     def terminate_process(self, upid):
         return self.connection.call(self.dashi_name, 'cancel_process', process_id=upid)
 
     def restart_process(self, upid):
         #return self.connection.call(self.dashi_name, 'restart_process', upid=upid)
-        raise CeiClientError("Pyon PD does not support restart")
+        raise OperationNotSupportedError("Pyon PD does not support restart")
 
     def dump(self):
         return self.connection.call(self.dashi_name, 'dump')
@@ -408,6 +463,17 @@ class PDClient(DashiCeiClient):
     def describe_processes(self):
         return self.connection.call(self.dashi_name, 'describe_processes')
 
+    def iter_processes(self):
+        """Yield processes one at a time
+
+        The process dispatcher replies with all processes at once, but
+        going through them with this rather than describe_processes lets
+        callers start on the first ones right away and not keep a copy of
+        every process they have handled.
+        """
+        for process in _iter_reply(self.describe_processes()):
+            yield process
+
     def terminate_process(self, upid):
         return self.connection.call(self.dashi_name, 'terminate_process', upid=upid)
 
@@ -548,12 +614,15 @@ class PyonPDClient(PyonCeiClient):
         return self._strip_pyon_attrs(self.connection.call(self.service_name, 'read_process', **message))
 
     def list_processes(self):
+        return list(self.iter_processes())
+
+    def iter_processes(self):
+        """Yield processes one at a time, see PDClient.iter_processes
+        """
         message = {}
         response = self.connection.call(self.service_name, 'list_processes', **message)
-        cleaned_list = []
-        for pyon_proc in response:
-            cleaned_list.append(self._strip_pyon_attrs(pyon_proc))
-        return cleaned_list
+        for pyon_proc in _iter_reply(response):
+            yield self._strip_pyon_attrs(pyon_proc)
 
 
 class PyonHAAgentClient(PyonCeiClient):
@@ -600,3 +669,33 @@ class ProvisionerClient(DashiCeiClient):
 
     def terminate_all(self):
         return self.connection.call(self.dashi_name, 'terminate_all')
+
+
+class AsyncDTRSClient(AsyncClient):
+
+    def __init__(self, connection, **kwargs):
+        AsyncClient.__init__(self, DTRSClient(connection, **kwargs))
+
+
+class AsyncEPUMClient(AsyncClient):
+
+    def __init__(self, connection, **kwargs):
+        AsyncClient.__init__(self, EPUMClient(connection, **kwargs))
+
+
+class AsyncPDClient(AsyncClient):
+
+    def __init__(self, connection, **kwargs):
+        AsyncClient.__init__(self, PDClient(connection, **kwargs))
+
+
+class AsyncHAAgentClient(AsyncClient):
+
+    def __init__(self, connection, **kwargs):
+        AsyncClient.__init__(self, HAAgentClient(connection, **kwargs))
+
+
+class AsyncProvisionerClient(AsyncClient):
+
+    def __init__(self, connection, **kwargs):
+        AsyncClient.__init__(self, ProvisionerClient(connection, **kwargs))
@@ -1,16 +1,46 @@
+import argparse
+import itertools
 import re
-import yaml
+import sys
 import time
 import uuid
 
-from jinja2 import Template
-from dashi.exceptions import NotFoundError, WriteConflictError, BadRequestError
-
+from backoff import DEFAULT_MAX_INTERVAL, Backoff, wait_for
+from concurrency import DEFAULT_MAX_WORKERS, WorkerPool
+from formatters import DOMAIN_COLUMNS, DOMAIN_DEFINITION_COLUMNS, NODE_COLUMNS, \
+        PROCESS_COLUMNS, PROCESS_DEFINITION_COLUMNS
 from client import DTRSClient, EPUMClient, HAAgentClient, PDClient, \
     ProvisionerClient, PyonPDClient, PyonHAAgentClient, PyonHTTPPDClient, \
     PyonHTTPHAAgentClient
-from exception import CeiClientError
-from common import safe_print, safe_pprint
+from exception import CeiClientError, OperationNotSupportedError, WaitTimeoutError
+from common import PROCESS_STATES, PYON_PROCESS_STATE_MAP, safe_print, safe_pprint
+import yamlio
+
+# yaml, jinja2 and dashi are comparatively expensive to import and most
+# ceictl invocations need at most one of them, so they are imported on
+# first use rather than when the command table is built.
+
+
+def _load_yaml(stream):
+    return yamlio.load(stream)
+
+
+def _dump_yaml(data):
+    return yamlio.dump(data)
+
+
+# Compiled output templates, by source. Compiling a template costs much more
+# than rendering it, so each one is compiled the first time it is needed
+# and reused by every later command in the process (e.g. in ceictl shell)
+_templates = {}
+
+
+def _template(source):
+    template = _templates.get(source)
+    if template is None:
+        from jinja2 import Template
+        template = _templates.setdefault(source, Template(source))
+    return template
 
 # Classes for different kinds of output
 
@@ -28,6 +58,12 @@ class CeiCommand(object):
     def details(result):
         safe_pprint(result)
 
+    @staticmethod
+    def failed(result):
+        """Return an error message if result reports a failure, after output
+        """
+        return None
+
 
 class CeiCommandPrintOutput(CeiCommand):
 
@@ -65,12 +101,14 @@ class DTRSAddDT(CeiCommandPrintOutput):
 
     @staticmethod
     def execute(client, opts):
+        from dashi.exceptions import WriteConflictError
+
         if opts.dt_def_file is None:
             raise CeiClientError("The --definition argument is missing")
 
         try:
             with open(opts.dt_def_file) as f:
-                dt_def = yaml.load(f)
+                dt_def = _load_yaml(f)
         except Exception, e:
             raise CeiClientError("Problem reading DT definition file %s: %s" % (opts.dt_def_file, e))
 
@@ -141,7 +179,7 @@ class DTRSUpdateDt(CeiCommandPrintOutput):
 
         try:
             with open(opts.dt_def_file) as f:
-                dt_def = yaml.load(f)
+                dt_def = _load_yaml(f)
         except Exception, e:
             raise CeiClientError("Problem reading DT definition file %s: %s" % (opts.dt_def_file, e))
 
@@ -163,12 +201,14 @@ class DTRSAddSite(CeiCommandPrintOutput):
 
     @staticmethod
     def execute(client, opts):
+        from dashi.exceptions import WriteConflictError
+
         if opts.site_def_file is None:
             raise CeiClientError("The --definition argument is missing")
 
         try:
             with open(opts.site_def_file) as f:
-                site_def = yaml.load(f)
+                site_def = _load_yaml(f)
         except Exception, e:
             raise CeiClientError("Problem reading site definition file %s: %s" % (opts.site_def_file, e))
 
@@ -238,7 +278,7 @@ class DTRSUpdateSite(CeiCommandPrintOutput):
 
         try:
             with open(opts.site_def_file) as f:
-                site_def = yaml.load(f)
+                site_def = _load_yaml(f)
         except Exception, e:
             raise CeiClientError("Problem reading site definition file %s: %s" % (opts.site_def_file, e))
 
@@ -261,12 +301,14 @@ class DTRSAddCredentials(CeiCommandPrintOutput):
 
     @staticmethod
     def execute(client, opts):
+        from dashi.exceptions import WriteConflictError
+
         if opts.credentials_def_file is None:
             raise CeiClientError("The --definition argument is missing")
 
         try:
             with open(opts.credentials_def_file) as f:
-                credentials_def = yaml.load(f)
+                credentials_def = _load_yaml(f)
         except Exception, e:
             raise CeiClientError("Problem reading credentials definition file %s: %s" % (opts.credentials_def_file, e))
 
@@ -346,7 +388,7 @@ class DTRSUpdateCredentials(CeiCommandPrintOutput):
 
         try:
             with open(opts.credentials_def_file) as f:
-                credentials_def = yaml.load(f)
+                credentials_def = _load_yaml(f)
         except Exception, e:
             raise CeiClientError("Problem reading credentials definition file %s: %s" % (opts.credentials_def_file, e))
 
@@ -372,7 +414,7 @@ class AddDomain(CeiCommand):
     def execute(client, opts):
         try:
             with open(opts.de_conf, 'r') as f:
-                conf = yaml.load(f)
+                conf = _load_yaml(f)
         except Exception, e:
             raise CeiClientError("Problem reading decision engine configuration file %s: %s" % (opts.de_conf, e))
 
@@ -411,13 +453,14 @@ Health:                  Monitor health  = {{result.config.health.monitor_health
 
     @staticmethod
     def output(result):
-        template = Template(DescribeDomain.output_template)
+        template = _template(DescribeDomain.output_template)
         safe_print(template.render(result=result))
 
 
 class ListDomains(CeiCommandPrintListOutput):
 
     name = 'list'
+    columns = DOMAIN_COLUMNS
 
     def __init__(self, subparsers):
         subparsers.add_parser(self.name)
@@ -507,7 +550,7 @@ class AddDomainDefinition(CeiCommand):
     def execute(client, opts):
         try:
             with open(opts.definition, 'r') as f:
-                definition = yaml.load(f)
+                definition = _load_yaml(f)
         except Exception, e:
             raise CeiClientError("Problem reading domain definition file %s: %s" % (opts.definition, e))
 
@@ -543,6 +586,7 @@ class DescribeDomainDefinition(CeiCommand):
 class ListDomainDefinitions(CeiCommandPrintListOutput):
 
     name = 'list'
+    columns = DOMAIN_DEFINITION_COLUMNS
 
     def __init__(self, subparsers):
         subparsers.add_parser(self.name)
@@ -566,7 +610,7 @@ class UpdateDomainDefinition(CeiCommand):
     def execute(client, opts):
         try:
             with open(opts.definition, 'r') as f:
-                definition = yaml.load(f)
+                definition = _load_yaml(f)
         except Exception, e:
             raise CeiClientError("Problem reading domain definition file %s: %s" % (opts.definition, e))
 
@@ -615,21 +659,73 @@ def _validate_process_definition(definition):
         raise ValueError("definition has invalid executable")
 
 
-def _load_process_definitions(definition_files):
-    definition_names = set()
+# When asked to, spec files are parsed in a pool of processes if there are
+# at least this many of them; for fewer, starting the pool costs more than
+# it could save
+PARALLEL_LOAD_MIN_FILES = 32
+
+
+def _read_process_definition(definition_path):
+    """Load and validate one process specification file
+
+    Returns (definition, None), or (None, error message) if the file is
+    invalid. This runs in the worker processes of _load_process_definitions,
+    so errors are returned as strings rather than raised.
+    """
+    try:
+        with open(definition_path) as f:
+            definition = _load_yaml(f)
+        _validate_process_definition(definition)
+    except Exception, e:
+        return None, "Problem reading process specification file %s: %s" % (definition_path, e)
+    return definition, None
+
+
+def _load_process_definitions(definition_files, processes=None):
+    """Load and validate process specification files, in order
+
+    If processes is more than 1, large sets of files are parsed by a pool
+    of that many processes; by default they are parsed here. Every invalid
+    file and duplicated name is reported in a single CeiClientError, not
+    just the first one.
+    """
+    pool = None
+    if processes is not None and processes > 1 and len(definition_files) >= PARALLEL_LOAD_MIN_FILES:
+        import multiprocessing
+        pool = multiprocessing.Pool(processes)
+
+    if pool is not None:
+        results = pool.imap(_read_process_definition, definition_files, chunksize=8)
+    else:
+        results = itertools.imap(_read_process_definition, definition_files)
+
+    definition_paths = {}
     definitions = []
-    for definition_path in definition_files:
-        try:
-            with open(definition_path) as f:
-                definition = yaml.load(f)
-                _validate_process_definition(definition)
-                definitions.append(definition)
-        except Exception, e:
-            raise CeiClientError("Problem reading process specification file %s: %s" % (definition_path, e))
-        name = definition['name']
-        if name in definition_names:
-            raise CeiClientError("Process definition name '%s' found in multiple definitions!" % name)
-        definition_names.add(name)
+    # (message on its own, message among others) for each problem
+    errors = []
+    try:
+        # names are checked as results come back from the workers
+        for definition_path, (definition, error) in itertools.izip(definition_files, results):
+            if error is not None:
+                errors.append((error, error))
+                continue
+            name = definition['name']
+            if name in definition_paths:
+                error = "Process definition name '%s' found in multiple definitions!" % name
+                errors.append((error, "%s (%s and %s)" % (error, definition_paths[name], definition_path)))
+                continue
+            definition_paths[name] = definition_path
+            definitions.append(definition)
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+    if len(errors) == 1:
+        raise CeiClientError(errors[0][0])
+    elif errors:
+        raise CeiClientError("%d problems with process specification files:\n  %s" % (
+            len(errors), "\n  ".join(detailed for _, detailed in errors)))
     return definitions
 
 
@@ -641,13 +737,15 @@ class PDCreateProcessDefinition(CeiCommand):
         parser = subparsers.add_parser(self.name)
         parser.add_argument('definitions', nargs="+")
         parser.add_argument('-i', '--definition-id', dest="definition_id", metavar='ID')
+        parser.add_argument('--load-processes', type=int, default=None, metavar='N',
+            help="Parse definition files in N processes (default: in this one)")
 
     @staticmethod
     def execute(client, opts):
 
         if len(opts.definitions) > 1 and opts.definition_id:
             raise CeiClientError("Cannot specify command line definition_id with multiple files")
-        definitions = _load_process_definitions(opts.definitions)
+        definitions = _load_process_definitions(opts.definitions, opts.load_processes)
 
         result = []
         for definition, filename in zip(definitions, opts.definitions):
@@ -667,6 +765,68 @@ class PDCreateProcessDefinition(CeiCommand):
         return result
 
 
+def _index_process_definitions(client):
+    """Fetch all existing process definitions in one call, indexed by name
+
+    Returns None if the PD can't list definitions (the Pyon PD can't), or
+    doesn't include their contents in the listing, in which case each
+    definition has to be described by name instead. Other errors, such as
+    the PD not replying, are raised rather than falling back to describing
+    every definition on a PD that just failed.
+    """
+    from dashi.exceptions import UnknownOperationError
+
+    try:
+        definitions = client.list_process_definitions()
+    except (OperationNotSupportedError, UnknownOperationError):
+        return None
+
+    index = {}
+    for definition in definitions or []:
+        if not isinstance(definition, dict) or not definition.get('name'):
+            return None
+        index[definition['name']] = definition
+    return index
+
+
+def _sync_process_definition(client, definition, index=None):
+    """Create or update one process definition, returning what was done
+
+    Existing definitions are looked up in index when one is provided, and
+    described by name otherwise.
+    """
+    from dashi.exceptions import NotFoundError
+
+    name = definition['name']
+    if index is not None:
+        found_definition = index.get(name)
+    else:
+        try:
+            found_definition = client.describe_process_definition(
+                process_definition_name=name)
+        except NotFoundError:
+            found_definition = None
+
+    if found_definition:
+        found_definition_id = found_definition.get('definition_id')
+        if not found_definition_id:
+            found_definition_id = found_definition.get('_id')
+        if not found_definition_id:
+            raise CeiClientError("Found '%s' definition without an ID??" % name)
+        found_executable = found_definition.get('executable')
+        if found_executable != definition['executable']:
+            client.update_process_definition(process_definition=definition,
+                process_definition_id=found_definition_id)
+            return "UPDATED"
+        else:
+            return "OK"
+    else:
+        definition_id = uuid.uuid4().hex
+        client.create_process_definition(process_definition=definition,
+            process_definition_id=definition_id)
+        return "CREATED"
+
+
 class PDSyncProcessDefinitions(CeiCommand):
 
     name = 'sync'
@@ -674,45 +834,36 @@ class PDSyncProcessDefinitions(CeiCommand):
     Ensure all of the provided process definitions exist and are up to date.
 
     Definitions which already exist are updated (but retain the same ID).
-    New definitions are created.
+    New definitions are created. Existing definitions are fetched with a
+    single list call when the PD supports it. Definitions are synced
+    concurrently; one failing doesn't stop the others from being synced.
     """
 
     def __init__(self, subparsers):
         parser = subparsers.add_parser(self.name, description=self.description)
         parser.add_argument('definitions', nargs="+", metavar="definition.yml")
+        parser.add_argument('--workers', type=int, default=DEFAULT_MAX_WORKERS, metavar='N',
+            help="Number of definitions to sync at the same time (default %d)" % DEFAULT_MAX_WORKERS)
+        parser.add_argument('--load-processes', type=int, default=None, metavar='N',
+            help="Parse definition files in N processes (default: in this one)")
 
     @staticmethod
     def execute(client, opts):
 
-        definitions = _load_process_definitions(opts.definitions)
+        definitions = _load_process_definitions(opts.definitions, opts.load_processes)
+        index = _index_process_definitions(client)
 
-        result = []
-        for definition in definitions:
-            name = definition['name']
-            try:
-                found_definition = client.describe_process_definition(
-                    process_definition_name=name)
-            except NotFoundError:
-                found_definition = None
-
-            if found_definition:
-                found_definition_id = found_definition.get('definition_id')
-                if not found_definition_id:
-                    found_definition_id = found_definition.get('_id')
-                if not found_definition_id:
-                    raise CeiClientError("Found '%s' definition without an ID??" % name)
-                found_executable = found_definition.get('executable')
-                if found_executable != definition['executable']:
-                    client.update_process_definition(process_definition=definition,
-                        process_definition_id=found_definition_id)
-                    result.append((name, "UPDATED"))
-                else:
-                    result.append((name, "OK"))
-            else:
-                definition_id = uuid.uuid4().hex
-                client.create_process_definition(process_definition=definition,
-                    process_definition_id=definition_id)
-                result.append((name, "CREATED"))
+        with WorkerPool(max(1, opts.workers)) as pool:
+            futures = [pool.submit(_sync_process_definition, client, definition, index)
+                for definition in definitions]
+
+            result = []
+            for definition, future in zip(definitions, futures):
+                try:
+                    status = future.result()
+                except Exception, e:
+                    status = "FAILED: %s" % e
+                result.append((definition['name'], status))
         return result
 
     @staticmethod
@@ -720,6 +871,13 @@ class PDSyncProcessDefinitions(CeiCommand):
         for name, status in result:
             print str(name).ljust(45) + "     " + str(status)
 
+    @staticmethod
+    def failed(result):
+        failures = [name for name, status in result if status.startswith("FAILED")]
+        if failures:
+            return "%d of %d process definitions failed to sync: %s" % (
+                len(failures), len(result), ", ".join(failures))
+
 
 class PDDescribeProcessDefinition(CeiCommand):
 
@@ -760,7 +918,7 @@ class PDUpdateProcessDefinition(CeiCommand):
     def execute(client, opts):
         try:
             with open(opts.process_spec) as f:
-                process_spec = yaml.load(f)
+                process_spec = _load_yaml(f)
         except Exception, e:
             raise CeiClientError("Problem reading process specification file %s: %s" % (opts.process_spec, e))
 
@@ -783,6 +941,7 @@ class PDRemoveProcessDefinition(CeiCommand):
 class PDListProcessDefinitions(CeiCommandPrintListOutput):
 
     name = 'list'
+    columns = PROCESS_DEFINITION_COLUMNS
 
     def __init__(self, subparsers):
         subparsers.add_parser(self.name)
@@ -792,6 +951,202 @@ class PDListProcessDefinitions(CeiCommandPrintListOutput):
         return client.list_process_definitions()
 
 
+# Operation the PD fires at subscribers when a process changes state
+PROCESS_STATE_OPERATION = 'process_state'
+
+# When waiting on state notifications, the process is still polled now and
+# then in case a notification was missed, starting EVENT_WAIT_POLL seconds
+# in and backing off to EVENT_WAIT_MAX_POLL
+EVENT_WAIT_POLL = 1.0
+EVENT_WAIT_MAX_POLL = 30.0
+
+
+PROCESS_READY_STATES = ("500-RUNNING", "800-EXITED")
+PROCESS_FAILED_STATES = ("850-FAILED", "900-REJECTED")
+
+PROCESS_TERMINATING = 600
+
+HA_AGENT_PREFIX = 'haagent'
+
+
+def _state_code(state):
+    """Return the numeric code of a process state like 500-RUNNING, or None
+    """
+    try:
+        return int(str(state).split('-', 1)[0])
+    except ValueError:
+        return None
+
+
+def _parse_state(value):
+    """argparse type accepting a state code (500), name (RUNNING) or both
+    """
+    code = _state_code(value)
+    if code is not None:
+        return code
+    for state in PROCESS_STATES:
+        if state.split('-', 1)[1] == value.upper():
+            return _state_code(state)
+    raise argparse.ArgumentTypeError("unknown process state %s" % value)
+
+
+def _process_definition_id(process):
+    definition = process.get('definition')
+    if isinstance(definition, dict) and definition.get('definition_id'):
+        return definition['definition_id']
+    return process.get('definition_id') or process.get('process_definition_id')
+
+
+def _process_engine(process):
+    constraints = process.get('constraints')
+    if isinstance(constraints, dict) and constraints.get('engine'):
+        return constraints['engine']
+    return process.get('engine_id')
+
+
+def _filter_processes(processes, state_min=None, state_max=None, name_prefix=None,
+        definition=None, engine=None):
+    """Yield the processes matching all of the filters that are set
+
+    state_min and state_max are inclusive numeric state codes. Processes
+    are checked one at a time as they are iterated over, in the form
+    extract_details gives them (gateway processes only have an integer
+    process_state), but are yielded as they were received.
+    """
+    for process in processes:
+        details = PDDescribeProcess.extract_details(process)
+        if state_min is not None or state_max is not None:
+            code = _state_code(details.get('state'))
+            if code is None:
+                continue
+            if state_min is not None and code < state_min:
+                continue
+            if state_max is not None and code > state_max:
+                continue
+        if name_prefix is not None and not (details.get('name') or '').startswith(name_prefix):
+            continue
+        if definition is not None and _process_definition_id(details) != definition:
+            continue
+        if engine is not None and _process_engine(details) != engine:
+            continue
+        yield process
+
+
+def _list_ha_agents(client):
+    """Return the HA agent processes that aren't terminating or terminated
+
+    They are returned as extract_details gives them, so that the HA list
+    templates work for gateway processes too.
+    """
+    return [PDDescribeProcess.extract_details(process) for process in _filter_processes(
+        client.iter_processes(), state_max=PROCESS_TERMINATING - 1, name_prefix=HA_AGENT_PREFIX)]
+
+
+def _check_process_state(process):
+    """Return process if it is running or has exited, raise if it failed
+    """
+    if not process:
+        return None
+    process = PDDescribeProcess.extract_details(process)
+    state = process.get('state')
+
+    if state in PROCESS_READY_STATES:
+        return process
+
+    if state in PROCESS_FAILED_STATES:
+        raise CeiClientError("FAILED. Process in %s state" % state)
+    return None
+
+
+def _wait_for_process(client, upid, max_wait, backoff, subscription=None):
+    """Wait for a process to be running or to have exited
+
+    Without a subscription the process is polled at the intervals given by
+    backoff. With one, state notifications from the PD are waited on
+    instead, and polling is only a fallback in case one was missed.
+    """
+    def check():
+        return _check_process_state(client.describe_process(upid))
+
+    def wait_for_notification(seconds):
+        deadline = time.time() + seconds
+        while time.time() < deadline:
+            notification = subscription.receive(deadline - time.time())
+            if notification is None:
+                continue
+            notified = notification.get('process')
+            if notified and notified.get('upid') == upid:
+                process = _check_process_state(notified)
+                if process:
+                    return process
+
+    return wait_for(check, max_wait, backoff,
+            "Timed out waiting for process %s" % upid,
+            wait=wait_for_notification if subscription is not None else None)
+
+
+def _unique(upids):
+    """Return upids without repeats, in the order they were first given
+    """
+    seen = set()
+    return [upid for upid in upids if not (upid in seen or seen.add(upid))]
+
+
+def _wait_for_processes(client, upids, max_wait, backoff, seen=None):
+    """Wait for several processes to be running, to have exited or to fail
+
+    All of them are checked with a single describe_processes call per
+    poll, and progress is reported on stderr. Returns the processes in the
+    order of upids once none are left pending, including failed ones.
+
+    If seen is given, the last description of each process is stored in
+    it by upid, so that callers know where processes got to on a timeout.
+    """
+    upids = _unique(upids)
+    pending = set(upids)
+    settled = {}
+    failed = []
+    progress = []
+
+    def check():
+        for process in client.describe_processes():
+            process = PDDescribeProcess.extract_details(process)
+            upid = process.get('upid')
+            if upid not in pending:
+                continue
+            if seen is not None:
+                seen[upid] = process
+            state = process.get('state')
+            if state in PROCESS_READY_STATES or state in PROCESS_FAILED_STATES:
+                pending.discard(upid)
+                settled[upid] = process
+                if state in PROCESS_FAILED_STATES:
+                    failed.append(upid)
+
+        counts = (len(upids) - len(pending) - len(failed), len(failed), len(pending))
+        if counts != tuple(progress):
+            progress[:] = counts
+            sys.stderr.write("%d ready, %d failed, %d pending\n" % counts)
+
+        if not pending:
+            return [settled[upid] for upid in upids]
+
+    def timeout_message():
+        return "Timed out waiting for %d of %d processes: %s" % (
+            len(pending), len(upids), ", ".join(sorted(pending)))
+
+    return wait_for(check, max_wait, backoff, timeout_message)
+
+
+def _read_process_ids(path):
+    try:
+        with open(path) as f:
+            return [line.strip() for line in f
+                if line.strip() and not line.strip().startswith('#')]
+    except Exception, e:
+        raise CeiClientError("Problem reading process ID file %s: %s" % (path, e))
+
+
 class PDScheduleProcess(CeiCommand):
 
     name = 'schedule'
@@ -811,6 +1166,15 @@ class PDScheduleProcess(CeiCommand):
         parser.add_argument('--execution-engine-id', metavar='execution_engine_id')
         parser.add_argument('--queueing-mode', metavar='queueing_mode')
         parser.add_argument('--restart-mode', metavar='restart_mode')
+        parser.add_argument('--wait', action='store_true',
+                help='Wait for the process to be running (or to have exited)')
+        parser.add_argument('--max', action='store', type=float, default=9600,
+                help='Max seconds to wait for process state')
+        parser.add_argument('--poll', action='store', type=float, default=EVENT_WAIT_POLL,
+                help='Seconds to wait before first checking on the process if no '
+                'state notification arrives')
+        parser.add_argument('--max-poll', action='store', type=float, default=EVENT_WAIT_MAX_POLL,
+                help='Max seconds to wait between checks on the process')
 
     @staticmethod
     def execute(client, opts):
@@ -824,22 +1188,189 @@ class PDScheduleProcess(CeiCommand):
         if opts.config:
             try:
                 with open(opts.config) as f:
-                    configuration = yaml.load(f)
+                    configuration = _load_yaml(f)
             except Exception, e:
                 raise CeiClientError("Problem reading process configuration file %s: %s"
-                    % (opts.configuration, e))
+                    % (opts.config, e))
+
+        # Have the PD notify a temporary queue of state changes so that
+        # waiting doesn't need to poll it, if the transport supports that
+        subscription = None
+        subscribers = None
+        if opts.wait:
+            try:
+                subscription = client.connection.subscribe(PROCESS_STATE_OPERATION)
+                subscribers = [(subscription.name, subscription.operation)]
+            except CeiClientError:
+                pass
+
+        try:
+            result = client.schedule_process(process_id,
+                    process_definition_id=opts.definition_id,
+                    process_definition_name=opts.definition_name,
+                    configuration=configuration, queueing_mode=opts.queueing_mode,
+                    execution_engine_id=opts.execution_engine_id,
+                    restart_mode=opts.restart_mode, subscribers=subscribers)
+            if not opts.wait:
+                return result
+            return _wait_for_process(client, process_id, opts.max,
+                    Backoff(opts.poll, opts.max_poll), subscription=subscription)
+        finally:
+            if subscription is not None:
+                subscription.close()
+
+
+def _load_process_manifest(path):
+    """Read a YAML or JSON manifest of processes to schedule
+
+    The manifest is a list of process specs (or a mapping with such a list
+    under 'processes'). Each spec takes the options of 'process schedule':
+    id, definition_id or definition_name, configuration (inline),
+    execution_engine_id, queueing_mode, restart_mode, and additionally
+    node_exclusive, constraints and count, to schedule several identical
+    processes.
+    """
+    try:
+        with open(path) as f:
+            manifest = _load_yaml(f)
+    except Exception, e:
+        raise CeiClientError("Problem reading process manifest %s: %s" % (path, e))
+
+    if isinstance(manifest, dict):
+        manifest = manifest.get('processes')
+    if not isinstance(manifest, list):
+        raise CeiClientError("Process manifest %s must contain a list of processes" % path)
+
+    specs = []
+    for i, spec in enumerate(manifest):
+        if not isinstance(spec, dict):
+            raise CeiClientError("Process %d in manifest %s is not a mapping" % (i, path))
+        if not (spec.get('id') or spec.get('definition_id') or spec.get('definition_name')):
+            raise CeiClientError("Process %d in manifest %s needs an id or process definition" % (i, path))
+        count = spec.get('count', 1)
+        if not isinstance(count, int) or isinstance(count, bool) or count < 1:
+            raise CeiClientError("Process %d in manifest %s has an invalid count %r" % (i, path, count))
+        if count > 1 and spec.get('id'):
+            raise CeiClientError("Process %d in manifest %s has both an id and a count" % (i, path))
+        for _ in range(count):
+            process_spec = dict(spec)
+            process_spec['id'] = spec.get('id') or uuid.uuid4().hex
+            specs.append(process_spec)
+
+    upids = set()
+    for spec in specs:
+        if spec['id'] in upids:
+            raise CeiClientError("Process id %s appears more than once in manifest %s" % (spec['id'], path))
+        upids.add(spec['id'])
+    return specs
+
+
+def _schedule_from_spec(client, spec):
+    return client.schedule_process(spec['id'],
+            process_definition_id=spec.get('definition_id'),
+            process_definition_name=spec.get('definition_name'),
+            configuration=spec.get('configuration'),
+            queueing_mode=spec.get('queueing_mode'),
+            restart_mode=spec.get('restart_mode'),
+            execution_engine_id=spec.get('execution_engine_id'),
+            node_exclusive=spec.get('node_exclusive'),
+            constraints=spec.get('constraints'))
+
+
+class PDScheduleProcessBatch(CeiCommand):
+
+    name = 'schedule-batch'
+
+    description = "Schedule all of the processes listed in a YAML or JSON manifest"
+
+    def __init__(self, subparsers):
+        parser = subparsers.add_parser(self.name, description=self.description)
+        parser.add_argument('manifest', metavar='processes.yml')
+        parser.add_argument('--max-in-flight', type=int, default=DEFAULT_MAX_WORKERS, metavar='N',
+                help='Number of processes to schedule at the same time (default %d)' % DEFAULT_MAX_WORKERS)
+        parser.add_argument('--wait', action='store_true',
+                help='Wait for all of the processes to be running (or to have exited)')
+        parser.add_argument('--max', action='store', type=float, default=9600,
+                help='Max seconds to wait for process state')
+        parser.add_argument('--poll', action='store', type=float, default=0.1,
+                help='Seconds to wait before the first poll')
+        parser.add_argument('--max-poll', action='store', type=float, default=DEFAULT_MAX_INTERVAL,
+                help='Max seconds to wait between polls; the wait doubles after each poll up to this')
+
+    @staticmethod
+    def execute(client, opts):
+        specs = _load_process_manifest(opts.manifest)
 
-        return client.schedule_process(process_id,
-                process_definition_id=opts.definition_id,
-                process_definition_name=opts.definition_name,
-                configuration=configuration, queueing_mode=opts.queueing_mode,
-                execution_engine_id=opts.execution_engine_id,
-                restart_mode=opts.restart_mode)
+        with WorkerPool(max(1, opts.max_in_flight)) as pool:
+            futures = [pool.submit(_schedule_from_spec, client, spec) for spec in specs]
+
+            result = []
+            for spec, future in zip(specs, futures):
+                try:
+                    future.result()
+                    state = "SCHEDULED"
+                except Exception, e:
+                    state = "FAILED: %s" % e
+                result.append({'upid': spec['id'], 'state': state,
+                    'definition': spec.get('definition_name') or spec.get('definition_id')})
+
+        scheduled = [row['upid'] for row in result if row['state'] == "SCHEDULED"]
+        if opts.wait and scheduled:
+            # The upids were generated here, so the table is returned even
+            # if the wait times out: it is the only record of them
+            seen = {}
+            wait_error = None
+            try:
+                _wait_for_processes(client, scheduled, opts.max,
+                        Backoff(opts.poll, opts.max_poll), seen=seen)
+            except WaitTimeoutError:
+                pass
+            except Exception, e:
+                wait_error = "%s" % e
+            for row in result:
+                if row['upid'] in seen:
+                    row['state'] = PDDescribeProcess.extract_details(seen[row['upid']]).get('state')
+                if row['upid'] in scheduled and row['state'] not in PROCESS_READY_STATES and \
+                        row['state'] not in PROCESS_FAILED_STATES:
+                    if wait_error is None:
+                        row['timed_out'] = True
+                    else:
+                        row['wait_error'] = wait_error
+        return result
+
+    @staticmethod
+    def output(result):
+        for row in result:
+            safe_print("%s  %s  %s" % (str(row['upid']).ljust(32),
+                str(row['definition']).ljust(30), row['state']))
+
+    @staticmethod
+    def details(result):
+        PDScheduleProcessBatch.output(result)
+
+    @staticmethod
+    def failed(result):
+        failures = [row['upid'] for row in result
+            if (row['state'] or '').startswith("FAILED") or row['state'] in PROCESS_FAILED_STATES]
+        timed_out = [row['upid'] for row in result if row.get('timed_out')]
+        wait_errors = [row for row in result if row.get('wait_error')]
+        messages = []
+        if failures:
+            messages.append("%d of %d processes failed: %s" % (len(failures), len(result), ", ".join(failures)))
+        if timed_out:
+            messages.append("Timed out waiting for %d of %d processes: %s" % (
+                len(timed_out), len(result), ", ".join(timed_out)))
+        if wait_errors:
+            messages.append("Stopped waiting for %d of %d processes: %s" % (
+                len(wait_errors), len(result), wait_errors[0]['wait_error']))
+        if messages:
+            return "\n".join(messages)
 
 
 class PDDescribeProcesses(CeiCommand):
 
     name = 'list'
+    columns = PROCESS_COLUMNS
     output_template = '''
 Process ID    = {{ result.upid }}
 Process Name  = {{ result.name }}
@@ -859,26 +1390,42 @@ Configuration = {{ result.configuration }}
 '''
 
     def __init__(self, subparsers):
-        subparsers.add_parser(self.name)
+        parser = subparsers.add_parser(self.name)
+        parser.add_argument('--state-min', type=_parse_state, default=None, metavar='STATE',
+                help='Only list processes in STATE (e.g. 500 or RUNNING) or a later state')
+        parser.add_argument('--state-max', type=_parse_state, default=None, metavar='STATE',
+                help='Only list processes in STATE or an earlier state')
+        parser.add_argument('--name-prefix', default=None, metavar='PREFIX',
+                help='Only list processes whose name starts with PREFIX')
+        parser.add_argument('--definition', default=None, metavar='DEFINITION_ID',
+                help='Only list processes of the process definition DEFINITION_ID')
+        parser.add_argument('--engine', default=None, metavar='ENGINE_ID',
+                help='Only list processes constrained to the execution engine ENGINE_ID')
 
     @staticmethod
     def execute(client, opts):
-        return client.describe_processes()
+        # The process dispatcher has no filtered listing, so processes are
+        # filtered here as the reply is walked. Processes are printed as
+        # they come rather than after all of them are collected
+        return _filter_processes(client.iter_processes(),
+            state_min=opts.state_min, state_max=opts.state_max,
+            name_prefix=opts.name_prefix, definition=opts.definition,
+            engine=opts.engine)
 
     @staticmethod
     def output(result):
-        template = Template(PDDescribeProcesses.output_template)
+        template = _template(PDDescribeProcesses.output_template)
         for raw_proc in result:
             raw_proc = PDDescribeProcess.extract_details(raw_proc)
             safe_print(template.render(result=raw_proc))
 
     @staticmethod
     def details(result):
-        template = Template(PDDescribeProcesses.details_template)
+        template = _template(PDDescribeProcesses.details_template)
         for raw_proc in result:
             raw_proc = PDDescribeProcess.extract_details(raw_proc)
-            raw_proc['constraints'] = yaml.safe_dump(raw_proc.get('constraints', {})).rstrip('\n')
-            raw_proc['configuration'] = yaml.safe_dump(raw_proc.get('configuration', {})).rstrip('\n')
+            raw_proc['constraints'] = _dump_yaml(raw_proc.get('constraints', {})).rstrip('\n')
+            raw_proc['configuration'] = _dump_yaml(raw_proc.get('configuration', {})).rstrip('\n')
             safe_print(template.render(result=raw_proc))
 
 
@@ -924,11 +1471,7 @@ Constraints    = {{ result.constraints }}
 Configuration  = {{ result.configuration }}
 '''
 
-    pyon_process_state_map = {
-        1: '200-REQUESTED', 2: '300-WAITING', 3: '400-PENDING', 4: '500-RUNNING',
-        5: '600-TERMINATING', 6: '700-TERMINATED', 7: '850-FAILED',
-        8: '900-REJECTED', 9: '800-EXITED'
-    }
+    pyon_process_state_map = PYON_PROCESS_STATE_MAP
 
     pyon_process_queue_map = {
         1: 'NEVER', 2: 'ALWAYS', 3: 'START_ONLY', 4: 'RESTART_ONLY',
@@ -978,12 +1521,12 @@ Configuration  = {{ result.configuration }}
 
     @staticmethod
     def output(result):
-        template = Template(PDDescribeProcess.output_template)
+        template = _template(PDDescribeProcess.output_template)
 
         result = PDDescribeProcess.extract_details(result)
 
-        result['constraints'] = yaml.safe_dump(result.get('constraints', {})).rstrip('\n')
-        result['configuration'] = yaml.safe_dump(result.get('configuration', {})).rstrip('\n')
+        result['constraints'] = _dump_yaml(result.get('constraints', {})).rstrip('\n')
+        result['configuration'] = _dump_yaml(result.get('configuration', {})).rstrip('\n')
         safe_print(template.render(result=result))
 
 
@@ -993,33 +1536,37 @@ class PDWaitProcess(CeiCommand):
 
     def __init__(self, subparsers):
         parser = subparsers.add_parser(self.name)
-        parser.add_argument('process_id', action='store',
-                help='The UPID of the process to wait on')
+        parser.add_argument('process_ids', action='store', nargs='*', metavar='process_id',
+                help='The UPIDs of the processes to wait on')
+        parser.add_argument('--file', '-f', action='store', dest='process_id_file',
+                help='File listing UPIDs of processes to wait on, one per line')
         parser.add_argument('--max', action='store', type=float, default=9600,
                 help='Max seconds to wait for process state')
         parser.add_argument('--poll', action='store', type=float, default=0.1,
-                help='Seconds to wait between polls')
+                help='Seconds to wait before the first poll')
+        parser.add_argument('--max-poll', action='store', type=float, default=DEFAULT_MAX_INTERVAL,
+                help='Max seconds to wait between polls; the wait doubles after each poll up to this')
 
     @staticmethod
     def execute(client, opts):
+        upids = list(opts.process_ids)
+        if opts.process_id_file:
+            upids.extend(_read_process_ids(opts.process_id_file))
+        upids = _unique(upids)
+        if not upids:
+            raise CeiClientError("Need at least one process ID to wait on")
 
-        deadline = time.time() + opts.max
-        while 1:
-            process = client.describe_process(opts.process_id)
-
-            if process:
-                process = PDDescribeProcess.extract_details(process)
-                state = process['state']
-
-                if state in ("500-RUNNING", "800-EXITED"):
-                    return process
-
-                if state in ("850-FAILED", "900-REJECTED"):
-                    raise CeiClientError("FAILED. Process in %s state" % state)
+        backoff = Backoff(opts.poll, opts.max_poll)
+        if len(upids) == 1:
+            return _wait_for_process(client, upids[0], opts.max, backoff)
 
-            if time.time() + opts.poll >= deadline:
-                raise CeiClientError("Timed out waiting for process %s" % opts.process_id)
-            time.sleep(opts.poll)
+        processes = _wait_for_processes(client, upids, opts.max, backoff)
+        failed = ["%s (%s)" % (process['upid'], process['state']) for process in processes
+            if process['state'] in PROCESS_FAILED_STATES]
+        if failed:
+            raise CeiClientError("%d of %d processes FAILED: %s" % (
+                len(failed), len(upids), ", ".join(failed)))
+        return processes
 
 
 class PDDump(CeiCommand):
@@ -1052,7 +1599,7 @@ class PyonPDCreateProcessDefinition(CeiCommand):
     def execute(client, opts):
         try:
             with open(opts.process_spec) as f:
-                process_spec = yaml.load(f)
+                process_spec = _load_yaml(f)
         except Exception, e:
             raise CeiClientError("Problem reading process specification file %s: %s" % (opts.process_spec, e))
 
@@ -1073,7 +1620,7 @@ class PyonPDUpdateProcessDefinition(CeiCommand):
     def execute(client, opts):
         try:
             with open(opts.process_spec) as f:
-                process_spec = yaml.load(f)
+                process_spec = _load_yaml(f)
         except Exception, e:
             raise CeiClientError("Problem reading process specification file %s: %s" % (opts.process_spec, e))
 
@@ -1113,6 +1660,7 @@ class PyonPDDeleteProcessDefinition(CeiCommand):
 class PyonPDListProcessDefinitions(CeiCommand):
 
     name = 'list'
+    columns = PROCESS_DEFINITION_COLUMNS
 
     def __init__(self, subparsers):
         subparsers.add_parser(self.name)
@@ -1204,13 +1752,13 @@ class PyonPDScheduleProcess(CeiCommand):
     def execute(client, opts):
         try:
             with open(opts.schedule) as f:
-                schedule = yaml.load(f)
+                schedule = _load_yaml(f)
         except Exception, e:
             raise CeiClientError("Problem reading process schedule file %s: %s" % (opts.schedule, e))
 
         try:
             with open(opts.configuration) as f:
-                configuration = yaml.load(f)
+                configuration = _load_yaml(f)
         except Exception:
             raise CeiClientError("Problem reading process configuration file %s: %s" % (opts.configuration, e))
         return client.schedule_process(opts.process_definition_id, schedule, configuration, opts.process_id)
@@ -1265,13 +1813,14 @@ class PyonPDWaitProcess(CeiCommand):
         parser.add_argument('--max', action='store', type=float, default=9600,
                 help='Max seconds to wait for process state')
         parser.add_argument('--poll', action='store', type=float, default=0.5,
-                help='Seconds to wait between polls')
+                help='Seconds to wait before the first poll')
+        parser.add_argument('--max-poll', action='store', type=float, default=DEFAULT_MAX_INTERVAL,
+                help='Max seconds to wait between polls; the wait doubles after each poll up to this')
 
     @staticmethod
     def execute(client, opts):
 
-        deadline = time.time() + opts.max
-        while 1:
+        def check():
             process = client.read_process(opts.process_id)
 
             if process:
@@ -1283,9 +1832,8 @@ class PyonPDWaitProcess(CeiCommand):
                 if state in (ProcessStateEnum.ERROR,):
                     raise CeiClientError("FAILED. Process in %s state" % ProcessStateEnum.to_str(state))
 
-            if time.time() + opts.poll >= deadline:
-                raise CeiClientError("Timed out waiting for process %s" % opts.process_id)
-            time.sleep(opts.poll)
+        return wait_for(check, opts.max, Backoff(opts.poll, opts.max_poll),
+                "Timed out waiting for process %s" % opts.process_id)
 
 
 class HAList(CeiCommand):
@@ -1307,10 +1855,7 @@ EEAgent       = {{ result.assigned }}
 
     @staticmethod
     def execute(client, opts):
-        all_procs = client.describe_processes()
-        ha_procs = [proc for proc in all_procs if proc['name'] and proc['name'].startswith('haagent')]
-        non_terminated_procs = [proc for proc in ha_procs if proc['state'] < '600']
-        return non_terminated_procs
+        return _list_ha_agents(client)
 
     @staticmethod
     def output(result):
@@ -1319,7 +1864,7 @@ EEAgent       = {{ result.assigned }}
 
     @staticmethod
     def details(result):
-        template = Template(HAList.details_template)
+        template = _template(HAList.details_template)
         for raw_proc in result:
             safe_print(template.render(result=raw_proc))
 
@@ -1360,13 +1905,13 @@ Policy Parameters: {% for key, val in result.policy_params.iteritems() %}
     @staticmethod
     def output(result):
         result['managed_upids'] = ",".join(result['managed_upids'])
-        template = Template(HADescribe.output_template)
+        template = _template(HADescribe.output_template)
         safe_print(template.render(result=result))
 
     @staticmethod
     def details(result):
         result['managed_upids'] = ",".join(result['managed_upids'])
-        template = Template(HADescribe.details_template)
+        template = _template(HADescribe.details_template)
         safe_print(template.render(result=result))
 
 
@@ -1396,7 +1941,7 @@ policy_params: {% for key, val in result.policy_params.iteritems() %}
 
     @staticmethod
     def output(result):
-        template = Template(HADumpPolicy.output_template)
+        template = _template(HADumpPolicy.output_template)
         safe_print(template.render(result=result))
 
 
@@ -1457,12 +2002,14 @@ class HAReconfigurePolicy(CeiCommand):
 
     @staticmethod
     def execute(client, opts):
+        from dashi.exceptions import BadRequestError
+
         ha_dashi_name = "ha_%s" % opts.process
         ha_client = HAAgent.ha_client(client.connection, dashi_name=ha_dashi_name)
         if opts.policy is not None:
             try:
                 with open(opts.policy) as f:
-                    policy = yaml.load(f)
+                    policy = _load_yaml(f)
                     policy_name = policy.get('policy_name')
                     policy_parameters = policy.get('policy_params')
             except Exception, e:
@@ -1491,6 +2038,17 @@ class HAReconfigurePolicy(CeiCommand):
             safe_print(result)
 
 
+def _check_ha_status(status):
+    """Return status if the HA Agent is ready, raise if it failed
+    """
+    if status:
+        if status in ("READY", "STEADY"):
+            return status
+        elif status == "FAILED":
+            raise CeiClientError("HA Agent in %s state" % status)
+    return None
+
+
 class HAWaitStatus(CeiCommand):
 
     name = 'wait'
@@ -1501,26 +2059,21 @@ class HAWaitStatus(CeiCommand):
         parser.add_argument('--max', action='store', type=float, default=9600,
                 help='Max seconds to wait for ready state')
         parser.add_argument('--poll', action='store', type=float, default=0.1,
-                help='Seconds to wait between polls')
+                help='Seconds to wait before the first poll')
+        parser.add_argument('--max-poll', action='store', type=float, default=DEFAULT_MAX_INTERVAL,
+                help='Max seconds to wait between polls; the wait doubles after each poll up to this')
 
     @staticmethod
     def execute(client, opts):
         ha_dashi_name = "ha_%s" % opts.process
         ha_client = HAAgent.ha_client(client.connection, dashi_name=ha_dashi_name)
 
-        deadline = time.time() + opts.max
-        while 1:
-
+        def check():
             status = ha_client.status()
-            if status:
-                if status in ("READY", "STEADY"):
-                    return status
-                elif status == "FAILED":
-                    raise CeiClientError("HA Agent in %s state" % status)
+            return _check_ha_status(status)
 
-            if time.time() + opts.poll >= deadline:
-                raise CeiClientError("Timed out waiting for HA Agent")
-            time.sleep(opts.poll)
+        return wait_for(check, opts.max, Backoff(opts.poll, opts.max_poll),
+                "Timed out waiting for HA Agent")
 
     @staticmethod
     def output(result):
@@ -1546,10 +2099,7 @@ EEAgent       = {{ result.assigned }}
 
     @staticmethod
     def execute(client, opts):
-        all_procs = client.describe_processes()
-        ha_procs = [proc for proc in all_procs if proc['name'] and proc['name'].startswith('haagent')]
-        non_terminated_procs = [proc for proc in ha_procs if proc['state'] < '600']
-        return non_terminated_procs
+        return _list_ha_agents(client)
 
     @staticmethod
     def output(result):
@@ -1558,7 +2108,7 @@ EEAgent       = {{ result.assigned }}
 
     @staticmethod
     def details(result):
-        template = Template(HAList.details_template)
+        template = _template(HAList.details_template)
         for raw_proc in result:
             safe_print(template.render(result=raw_proc))
 
@@ -1599,13 +2149,13 @@ Policy Parameters: {% for key, val in result.policy_params.iteritems() %}
     @staticmethod
     def output(result):
         result['managed_upids'] = ",".join(result['managed_upids'])
-        template = Template(HADescribe.output_template)
+        template = _template(HADescribe.output_template)
         safe_print(template.render(result=result))
 
     @staticmethod
     def details(result):
         result['managed_upids'] = ",".join(result['managed_upids'])
-        template = Template(HADescribe.details_template)
+        template = _template(HADescribe.details_template)
         safe_print(template.render(result=result))
 
 
@@ -1635,7 +2185,7 @@ policy_params: {% for key, val in result.policy_params.iteritems() %}
 
     @staticmethod
     def output(result):
-        template = Template(HADumpPolicy.output_template)
+        template = _template(HADumpPolicy.output_template)
         safe_print(template.render(result=result))
 
 
@@ -1700,12 +2250,14 @@ class PyonHTTPHAReconfigurePolicy(CeiCommand):
 
     @staticmethod
     def execute(client, opts):
+        from dashi.exceptions import BadRequestError
+
         ha_dashi_name = "ha_%s" % opts.process
         ha_client = HAAgent.ha_client(client.connection, dashi_name=ha_dashi_name)
         if opts.policy is not None:
             try:
                 with open(opts.policy) as f:
-                    policy = yaml.load(f)
+                    policy = _load_yaml(f)
                     policy_name = policy.get('policy_name')
                     policy_parameters = policy.get('policy_params')
             except Exception, e:
@@ -1743,27 +2295,21 @@ class PyonHTTPHAWaitStatus(CeiCommand):
         parser.add_argument('--max', action='store', type=float, default=9600,
                 help='Max seconds to wait for ready state')
         parser.add_argument('--poll', action='store', type=float, default=0.1,
-                help='Seconds to wait between polls')
+                help='Seconds to wait before the first poll')
+        parser.add_argument('--max-poll', action='store', type=float, default=DEFAULT_MAX_INTERVAL,
+                help='Max seconds to wait between polls; the wait doubles after each poll up to this')
 
     @staticmethod
     def execute(client, opts):
         process_id = client.get_ha_process_id(opts.process)
         ha_client = PyonHTTPHAAgent.ha_client(client.connection, dashi_name=process_id)
 
-        deadline = time.time() + opts.max
-        while 1:
-
+        def check():
             status = ha_client.status()
-            status = status['result']
-            if status:
-                if status in ("READY", "STEADY"):
-                    return status
-                elif status == "FAILED":
-                    raise CeiClientError("HA Agent in %s state" % status)
+            return _check_ha_status(status['result'])
 
-            if time.time() + opts.poll >= deadline:
-                raise CeiClientError("Timed out waiting for HA Agent")
-            time.sleep(opts.poll)
+        return wait_for(check, opts.max, Backoff(opts.poll, opts.max_poll),
+                "Timed out waiting for HA Agent")
 
     @staticmethod
     def output(result):
@@ -1794,7 +2340,7 @@ class PyonHAReconfigurePolicy(CeiCommand):
     def execute(client, opts):
         try:
             with open(opts.policy) as f:
-                policy = yaml.load(f)
+                policy = _load_yaml(f)
         except Exception, e:
             raise CeiClientError("Problem reading policy file %s: %s" % (opts.policy, e))
         return client.reconfigure_policy(policy)
@@ -1817,6 +2363,7 @@ class ProvisionerDump(CeiCommand):
 class ProvisionerDescribeNodes(CeiCommand):
 
     name = 'describe'
+    columns = NODE_COLUMNS
 
     def __init__(self, subparsers):
         parser = subparsers.add_parser(self.name)
@@ -1843,7 +2390,7 @@ class ProvisionerProvision(CeiCommand):
     def execute(client, opts):
         try:
             with open(opts.provisioning_var_file) as vars_file:
-                vars = yaml.load(vars_file)
+                vars = _load_yaml(vars_file)
         except Exception, e:
             raise CeiClientError("Problem reading provisioning variables file %s: %s" % (opts.provisioning_var_file, e))
 
@@ -1993,7 +2540,7 @@ class PyonHTTPProcess(CeiService):
     help = 'Control the Process Dispatcher Service'
 
     commands = {}
-    for command in [PDScheduleProcess, PDDescribeProcess, PDDescribeProcesses,
+    for command in [PDScheduleProcess, PDScheduleProcessBatch, PDDescribeProcess, PDDescribeProcesses,
             PDTerminateProcess, PDDump, PDRestartProcess, PDWaitProcess]:
         commands[command.name] = command
 
@@ -2024,7 +2571,7 @@ class Process(CeiService):
     help = 'Control the Process Dispatcher Service'
 
     commands = {}
-    for command in [PDScheduleProcess, PDDescribeProcess, PDDescribeProcesses,
+    for command in [PDScheduleProcess, PDScheduleProcessBatch, PDDescribeProcess, PDDescribeProcesses,
             PDTerminateProcess, PDDump, PDRestartProcess, PDWaitProcess, PDNodeState]:
         commands[command.name] = command
 
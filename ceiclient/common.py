@@ -1,7 +1,24 @@
 import os
 import sys
+import json
 import errno
 import pprint
+import tempfile
+
+CLOUDINITD_DIR = '.cloudinitd'
+
+# Process states, in lifecycle order. States are compared by their numeric
+# code, since comparing the strings breaks as soon as codes differ in length
+PROCESS_STATES = ("100-UNSCHEDULED", "150-UNSCHEDULED_PENDING", "200-REQUESTED",
+    "250-DIED_REQUESTED", "300-WAITING", "350-ASSIGNED", "400-PENDING", "500-RUNNING",
+    "600-TERMINATING", "700-TERMINATED", "800-EXITED", "850-FAILED", "900-REJECTED")
+
+# Process states by the integer process_state of Pyon (and gateway) processes
+PYON_PROCESS_STATE_MAP = {
+    1: '200-REQUESTED', 2: '300-WAITING', 3: '400-PENDING', 4: '500-RUNNING',
+    5: '600-TERMINATING', 6: '700-TERMINATED', 7: '850-FAILED',
+    8: '900-REJECTED', 9: '800-EXITED'
+}
 
 
 def safe_print(p_str):
@@ -24,7 +41,84 @@ def safe_pprint(p_str):
             raise
 
 
-def load_cloudinitd_db(run_name):
+def _cloudinitd_paths(run_name):
+    """Return the paths of the cloudinit.d DB of run_name and of our cache of it
+    """
+    directory = os.path.join(os.environ['HOME'], CLOUDINITD_DIR)
+    return (os.path.join(directory, 'cloudinitd-%s.db' % run_name),
+            os.path.join(directory, 'ceiclient-%s.json' % run_name))
+
+
+def _db_stamp(db_path):
+    try:
+        st = os.stat(db_path)
+    except OSError:
+        return None
+    return [st.st_mtime, st.st_size]
+
+
+def _read_settings_cache(cache_path, run_name, stamp):
+    try:
+        with open(cache_path) as f:
+            cached = json.load(f)
+    except (IOError, ValueError):
+        return None
+
+    if not isinstance(cached, dict) or cached.get('run_name') != run_name or cached.get('db') != stamp:
+        return None
+
+    vars = {}
+    for key, value in cached.get('vars', {}).items():
+        if isinstance(value, unicode):
+            value = value.encode('utf-8')
+        vars[str(key)] = value
+    return vars
+
+
+def _write_settings_cache(cache_path, run_name, stamp, vars):
+    # The settings include the broker password, so the cache is created
+    # readable by its owner only, and renamed into place so that a
+    # concurrent ceictl never reads half of it
+    directory = os.path.dirname(cache_path)
+    try:
+        fd, tmp_path = tempfile.mkstemp(prefix='.ceiclient-', dir=directory)
+    except OSError:
+        return
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'run_name': run_name, 'db': stamp, 'vars': vars}, f)
+        os.rename(tmp_path, cache_path)
+    except (IOError, OSError, TypeError, ValueError):
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+
+
+def load_cloudinitd_db(run_name, use_cache=True):
+    """Read the connection settings of a cloudinit.d run
+
+    Loading them through cloudinit.d is slow, so they are cached next to
+    its DB, and read from there for as long as the DB is unchanged.
+    """
+    db_path, cache_path = _cloudinitd_paths(run_name)
+    stamp = _db_stamp(db_path)
+
+    if use_cache and stamp is not None:
+        vars = _read_settings_cache(cache_path, run_name, stamp)
+        if vars is not None:
+            return vars
+
+    vars = _load_cloudinitd_vars(run_name)
+
+    # cloudinit.d may have just written the DB; don't record a stamp that
+    # is already out of date
+    if stamp is not None and _db_stamp(db_path) == stamp:
+        _write_settings_cache(cache_path, run_name, stamp, vars)
+    return vars
+
+
+def _load_cloudinitd_vars(run_name):
 
     # doing imports within function because they are not needed elsewhere
     # and they are surprisingly expensive.
@@ -0,0 +1,209 @@
+import sys
+import threading
+import time
+import Queue
+
+DEFAULT_MAX_WORKERS = 8
+
+
+class Future(object):
+    """The result of a call that may not have completed yet
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._done = False
+        self._result = None
+        self._exc_info = None
+        self._callbacks = []
+
+    def done(self):
+        with self._condition:
+            return self._done
+
+    def _wait(self, timeout):
+        with self._condition:
+            if not self._done:
+                self._condition.wait(timeout)
+            if not self._done:
+                raise FutureTimeout()
+
+    def result(self, timeout=None):
+        """Wait for the call to complete and return its result
+
+        If the call raised, the exception is raised again here, with its
+        original traceback.
+        """
+        self._wait(timeout)
+        if self._exc_info is not None:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        return self._result
+
+    def exception(self, timeout=None):
+        self._wait(timeout)
+        if self._exc_info is not None:
+            return self._exc_info[1]
+        return None
+
+    def add_done_callback(self, fn):
+        """Call fn(future) once the call completes
+
+        fn is called right away, from the calling thread, if the call has
+        already completed; otherwise from the thread that completes it.
+        """
+        with self._condition:
+            if not self._done:
+                self._callbacks.append(fn)
+                return
+        fn(self)
+
+    def set_result(self, result):
+        with self._condition:
+            self._result = result
+            self._done = True
+            self._condition.notify_all()
+        self._run_callbacks()
+
+    def set_exception(self, exc_info):
+        with self._condition:
+            self._exc_info = exc_info
+            self._done = True
+            self._condition.notify_all()
+        self._run_callbacks()
+
+    def _run_callbacks(self):
+        with self._condition:
+            callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            try:
+                fn(self)
+            except Exception:
+                # a broken callback mustn't keep the others from running
+                pass
+
+
+class FutureTimeout(Exception):
+    pass
+
+
+def gather(futures):
+    """Return a Future for the list of results of futures, in the same order
+
+    It fails with the first exception raised by one of them.
+    """
+    futures = list(futures)
+    gathered = Future()
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    if not futures:
+        gathered.set_result([])
+        return gathered
+
+    def collect(future):
+        with lock:
+            if remaining[0] == 0:
+                return
+            if future._exc_info is not None:
+                remaining[0] = 0
+            else:
+                remaining[0] -= 1
+                if remaining[0] > 0:
+                    return
+        if future._exc_info is not None:
+            gathered.set_exception(future._exc_info)
+        else:
+            gathered.set_result([f._result for f in futures])
+
+    for future in futures:
+        future.add_done_callback(collect)
+    return gathered
+
+
+def as_completed(futures, timeout=None):
+    """Yield futures as they complete, whatever order they were started in
+
+    FutureTimeout is raised if they haven't all completed within timeout
+    seconds.
+    """
+    futures = list(futures)
+    completed = Queue.Queue()
+    for future in futures:
+        future.add_done_callback(completed.put)
+
+    deadline = None if timeout is None else time.time() + timeout
+    for _ in futures:
+        if deadline is None:
+            # Queue.get without a timeout can't be interrupted by ^C
+            wait = sys.maxint
+        else:
+            wait = deadline - time.time()
+        try:
+            yield completed.get(timeout=max(wait, 0))
+        except Queue.Empty:
+            raise FutureTimeout()
+
+
+class WorkerPool(object):
+    """A bounded pool of threads running submitted calls
+
+    At most max_workers calls run at the same time; the others are queued.
+    Threads are started as work is submitted, so a pool that only ever
+    gets a couple of calls only starts a couple of threads.
+    """
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS):
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        self.max_workers = max_workers
+        self._queue = Queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._shutdown = False
+
+    def submit(self, func, *args, **kwargs):
+        future = Future()
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("cannot submit to a pool that was shut down")
+            self._queue.put((future, func, args, kwargs))
+            if len(self._threads) < self.max_workers:
+                thread = threading.Thread(target=self._work)
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+        return future
+
+    def map(self, func, iterable):
+        """Submit func for each item, returning futures in the same order
+        """
+        return [self.submit(func, item) for item in iterable]
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            self._shutdown = True
+            threads = list(self._threads)
+        for _ in threads:
+            self._queue.put(None)
+        if wait:
+            for thread in threads:
+                thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+    def _work(self):
+        while True:
+            work = self._queue.get()
+            if work is None:
+                return
+            future, func, args, kwargs = work
+            try:
+                result = func(*args, **kwargs)
+            except BaseException:
+                future.set_exception(sys.exc_info())
+            else:
+                future.set_result(result)
@@ -1,30 +1,128 @@
 import socket
 import sys
 import json
+import time
+import threading
 import requests
-import traceback
+import uuid
+
+from requests.adapters import HTTPAdapter
 
 from dashi import DashiConnection
 from dashi.bootstrap import DEFAULT_EXCHANGE
 from dashi.exceptions import NotFoundError
 
-from ceiclient.exception import CeiClientError
+from ceiclient.breaker import CircuitBreakers
+from ceiclient.concurrency import DEFAULT_MAX_WORKERS, Future, WorkerPool
+from ceiclient.exception import CeiClientError, CeiConnectionError
+from ceiclient.instrumentation import instrumented_call, record_retry
+from ceiclient.retry import RetryPolicy
 
 PYON_RETRIES = 5
 
+# Number of per-host connection pools kept by the gateway session, the
+# maximum number of connections kept alive in each of them, and the number
+# of seconds after which idle connections are dropped rather than reused
+DEFAULT_GATEWAY_POOL_SIZE = 1
+DEFAULT_GATEWAY_POOL_MAXSIZE = 10
+DEFAULT_GATEWAY_POOL_IDLE_TIMEOUT = 30
+
+# Gateway replies meaning the request didn't reach the service
+GATEWAY_UNAVAILABLE_STATUSES = (502, 503, 504)
+
+
+_lazy_init_lock = threading.Lock()
+
 
 class CeiConnection(object):
     """Abstract class defining the interface to talk with CEI services"""
 
+    # Maximum number of calls started with call_async that run at once
+    max_async_calls = DEFAULT_MAX_WORKERS
+
+    _async_pool = None
+
+    # ceiclient.instrumentation.Instrument hooks run around each call
+    instruments = ()
+
+    # When failed calls are made again, see ceiclient.retry
+    retry_policy = RetryPolicy()
+
+    _circuit_breakers = None
+
+    def add_instrument(self, instrument):
+        self.instruments = self.instruments + (instrument,)
+
+    @property
+    def circuit_breakers(self):
+        """Per-service circuit breakers, see ceiclient.breaker
+        """
+        with _lazy_init_lock:
+            if self._circuit_breakers is None:
+                self._circuit_breakers = CircuitBreakers()
+            return self._circuit_breakers
+
     def call(self, service, operation, **kwargs):
+        if not self.instruments:
+            return self._guarded_call(service, operation, **kwargs)
+        return instrumented_call(self.instruments, self._guarded_call, service, operation, kwargs)
+
+    def _guarded_call(self, service, operation, **kwargs):
+        return self.circuit_breakers.call(self._retrying_call, service, operation, kwargs)
+
+    def _retrying_call(self, service, operation, **kwargs):
+        return self.retry_policy.call(self._call, service, operation, kwargs,
+                on_retry=lambda error: record_retry(self.instruments, error))
+
+    def _call(self, service, operation, **kwargs):
+        """Send a request to the service and return its reply
+        """
         pass
 
+    def call_async(self, service, operation, **kwargs):
+        """Start a call and return a ceiclient.concurrency.Future for its result
+        """
+        return self.submit(self.call, service, operation, **kwargs)
+
+    def submit(self, func, *args, **kwargs):
+        """Run func(*args, **kwargs) alongside other calls on this connection
+
+        Up to max_async_calls of them run at the same time, each waiting on
+        its own reply, so callers can keep many requests in flight instead
+        of making them one after the other.
+        """
+        with _lazy_init_lock:
+            if self._async_pool is None:
+                self._async_pool = WorkerPool(self.max_async_calls)
+            pool = self._async_pool
+        return pool.submit(func, *args, **kwargs)
+
+    def disconnect(self):
+        self._shutdown_async()
+
+    def _shutdown_async(self):
+        """Wait for calls started with call_async before disconnecting
+        """
+        with _lazy_init_lock:
+            pool, self._async_pool = self._async_pool, None
+        if pool is not None:
+            pool.shutdown()
+
+    def subscribe(self, operation):
+        """Create a temporary queue that services can send notifications to
+
+        Returns a subscription whose name and operation can be handed to a
+        service as a subscriber (see PDClient.schedule_process).
+        """
+        raise CeiClientError("%s does not support subscriptions" % self.__class__.__name__)
+
 
 class DashiCeiConnection(CeiConnection):
 
     _name = 'ceiclient'
 
-    def __init__(self, broker, username, password, exchange=None, timeout=None, port=5672, ssl=False, sysname=None):
+    def __init__(self, broker, username, password, exchange=None, timeout=None, port=5672, ssl=False, sysname=None,
+            retry_policy=None, circuit_breakers=None):
         self.amqp_broker = broker
         self.amqp_username = username
         self.amqp_password = password
@@ -32,40 +130,115 @@ class DashiCeiConnection(CeiConnection):
         self.sysname = sysname
         self.amqp_exchange = exchange or DEFAULT_EXCHANGE
         self.timeout = timeout
+        self.ssl = ssl
+        if retry_policy is not None:
+            self.retry_policy = retry_policy
+        self._circuit_breakers = circuit_breakers
 
-        self.dashi_connection = DashiConnection(self._name,
+        self.dashi_connection = self._connect()
+
+        self._local = threading.local()
+        self._local.dashi_connection = self.dashi_connection
+        self._connections = [self.dashi_connection]
+        self._connections_lock = threading.Lock()
+
+    def _connect(self, name=None):
+        return DashiConnection(name or self._name,
                 'amqp://%s:%s@%s:%s//' % (
                     self.amqp_username,
                     self.amqp_password, self.amqp_broker,
                     self.amqp_port),
-                self.amqp_exchange, ssl=ssl, sysname=self.sysname)
-
-    def call(self, service, operation, **kwargs):
+                self.amqp_exchange, ssl=self.ssl, sysname=self.sysname)
+
+    def _thread_connection(self):
+        """Return the DashiConnection to use from the calling thread
+
+        A DashiConnection can't be used from several threads at once, so
+        threads other than the one that created this connection (e.g. the
+        workers of a ceiclient.concurrency.WorkerPool) each get their own.
+        """
+        dashi_connection = getattr(self._local, 'dashi_connection', None)
+        if dashi_connection is None:
+            dashi_connection = self._connect()
+            self._local.dashi_connection = dashi_connection
+            with self._connections_lock:
+                self._connections.append(dashi_connection)
+        return dashi_connection
+
+    def _call(self, service, operation, **kwargs):
         try:
-            return self.dashi_connection.call(service, operation, self.timeout, **kwargs)
+            return self._thread_connection().call(service, operation, self.timeout, **kwargs)
         except socket.timeout as e:
-            raise CeiClientError("timed out")
+            raise CeiConnectionError("timed out")
         except socket.error as e:
-            raise CeiClientError(e)
+            raise CeiConnectionError(e)
 
     def fire(self, service, operation, **kwargs):
         try:
-            return self.dashi_connection.fire(service, operation, **kwargs)
+            return self._thread_connection().fire(service, operation, **kwargs)
         except socket.timeout as e:
-            raise CeiClientError("timed out")
+            raise CeiConnectionError("timed out")
         except socket.error as e:
-            raise CeiClientError(e)
+            raise CeiConnectionError(e)
+
+    def subscribe(self, operation):
+        return DashiCeiSubscription(self, operation)
 
     def disconnect(self):
-        self.dashi_connection.disconnect()
+        self._shutdown_async()
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for dashi_connection in connections:
+            dashi_connection.disconnect()
+
+
+class DashiCeiSubscription(object):
+    """Temporary dashi queue receiving notifications fired at it by services
+
+    The queue gets a unique name so that concurrent ceictl invocations don't
+    steal each other's notifications, and goes away once it is closed.
+    """
+
+    def __init__(self, connection, operation):
+        self.name = "%s_%s" % (connection._name, uuid.uuid4().hex)
+        self.operation = operation
+        self._notifications = []
+        self._dashi_connection = connection._connect(self.name)
+        self._dashi_connection.handle(self._notify, operation)
+
+    def _notify(self, **kwargs):
+        self._notifications.append(kwargs)
+
+    def receive(self, timeout):
+        """Wait up to timeout seconds for a notification
+
+        Returns the keyword arguments the notification was fired with, or
+        None if nothing arrived in time.
+        """
+        if not self._notifications and timeout > 0:
+            try:
+                self._dashi_connection.consume(count=1, timeout=timeout)
+            except socket.timeout:
+                pass
+            except socket.error as e:
+                raise CeiConnectionError(e)
+        if self._notifications:
+            return self._notifications.pop(0)
+        return None
+
+    def close(self):
+        self._dashi_connection.disconnect()
 
 
 class PyonCeiConnection(CeiConnection):
 
     _name = 'ceiclient'
 
+    retry_policy = RetryPolicy(max_attempts=PYON_RETRIES)
+
     def __init__(self, broker, username, password, vhost='/',
-            sysname=None, timeout=None, port=5672, ssl=False):
+            sysname=None, timeout=None, port=5672, ssl=False, retry_policy=None,
+            circuit_breakers=None):
 
         try:
             from pyon.net.messaging import make_node
@@ -86,6 +259,9 @@ class PyonCeiConnection(CeiConnection):
             'port': port
         }
         self.timeout = timeout
+        if retry_policy is not None:
+            self.retry_policy = retry_policy
+        self._circuit_breakers = circuit_breakers
 
         self.sysname = sysname or get_default_sysname()
 
@@ -108,34 +284,35 @@ class PyonCeiConnection(CeiConnection):
         self.pyon_node = node
         self.pyon_ioloop = ioloop
 
-    def call(self, service, operation, retry=PYON_RETRIES, **kwargs):
+    def _call(self, service, operation, **kwargs):
 
         pyonex = self.pyonexception
 
         to_name = (self.sysname, service)
         client = self.RPCClient(node=self.pyon_node, to_name=to_name)
-        for i in range(0, retry):
-            try:
-                ret = client.request(kwargs, op=operation)
-                break
-            except pyonex.IonException, e:
-                if e.status_code in (pyonex.TIMEOUT, pyonex.SERVER_ERROR,
-                        pyonex.SERVICE_UNAVAILABLE):
-                    print >> sys.stderr, "Problem calling Pyon, retry %s" % i
-                    print >> sys.stderr, traceback.format_exc()
-                    continue
-                else:
-                    raise
-        else:
-            raise CeiClientError("Tried %s times to do %s. Giving up." % (retry, operation))
-
-        return ret
+        try:
+            return client.request(kwargs, op=operation)
+        except pyonex.IonException, e:
+            if e.status_code in (pyonex.TIMEOUT, pyonex.SERVER_ERROR,
+                    pyonex.SERVICE_UNAVAILABLE):
+                raise CeiConnectionError("Problem calling Pyon to do %s: %s" % (operation, e))
+            raise
 
     def fire(self, service, operation, **kwargs):
         to_name = (self.sysname, service)
         client = self.RPCClient(node=self.pyon_node, to_name=to_name)
         return client.request(kwargs, op=operation)
 
+    def submit(self, func, *args, **kwargs):
+        # The pyon node runs on gevent and can't be used from other threads,
+        # so calls complete before the future is returned
+        future = Future()
+        try:
+            future.set_result(func(*args, **kwargs))
+        except Exception:
+            future.set_exception(sys.exc_info())
+        return future
+
     def disconnect(self):
         self.pyon_node.stop_node()
         self.pyon_ioloop.kill()
@@ -143,12 +320,20 @@ class PyonCeiConnection(CeiConnection):
 
 class PyonHTTPGateWayCeiConnection(CeiConnection):
 
-    def __init__(self, hostname, timeout=None, port=5001, ssl=False):
+    def __init__(self, hostname, timeout=None, port=5001, ssl=False,
+            pool_size=DEFAULT_GATEWAY_POOL_SIZE,
+            pool_maxsize=DEFAULT_GATEWAY_POOL_MAXSIZE,
+            pool_idle_timeout=DEFAULT_GATEWAY_POOL_IDLE_TIMEOUT,
+            retry_policy=None, circuit_breakers=None):
 
         self.hostname = hostname
         self.timeout = timeout
         self.port = port
         self.ssl = ssl
+        self.pool_idle_timeout = pool_idle_timeout
+        if retry_policy is not None:
+            self.retry_policy = retry_policy
+        self._circuit_breakers = circuit_breakers
 
         if self.ssl:
             self.scheme = "https"
@@ -157,6 +342,39 @@ class PyonHTTPGateWayCeiConnection(CeiConnection):
 
         self.url = "%s://%s:%s" % (self.scheme, self.hostname, self.port)
 
+        # Keep-alive connections are reused across calls. pool_block makes
+        # pool_maxsize a hard limit on concurrent connections to the gateway
+        adapter = HTTPAdapter(pool_connections=pool_size,
+                pool_maxsize=pool_maxsize, pool_block=True)
+        self.session = requests.Session()
+        self.session.mount("%s://" % self.scheme, adapter)
+        self._last_used = time.time()
+        # Number of requests using the session, which is shared by the
+        # workers making calls started with call_async
+        self._in_flight = 0
+        self._session_lock = threading.Lock()
+
+    def _acquire_session(self):
+        """Count a request as using the session, evicting idle connections first
+
+        Pooled connections that sat idle longer than pool_idle_timeout are
+        dropped, since the gateway (or something in between) is likely to
+        have closed them already and reusing them would only fail. That is
+        only done while no other request is using the session, so
+        connections in use are never closed under a request.
+        """
+        with self._session_lock:
+            if (self._in_flight == 0 and self.pool_idle_timeout is not None and
+                    time.time() - self._last_used > self.pool_idle_timeout):
+                self.session.close()
+            self._in_flight += 1
+            return self.session
+
+    def _release_session(self):
+        with self._session_lock:
+            self._in_flight -= 1
+            self._last_used = time.time()
+
     def _make_url(self, service, operation, call_type=None):
         if call_type is None:
             call_type = 'service'
@@ -210,11 +428,21 @@ class PyonHTTPGateWayCeiConnection(CeiConnection):
         params = {'payload': json.dumps(payload)}
         return params
 
-    def call(self, service, operation, retry=PYON_RETRIES, call_type=None, **kwargs):
+    def _call(self, service, operation, call_type=None, **kwargs):
 
         url = self._make_url(service, operation, call_type=call_type)
         params = self._make_parameters(service, operation, kwargs, call_type=call_type)
-        result = requests.post(url, data=params)
+        session = self._acquire_session()
+        try:
+            result = session.post(url, data=params, timeout=self.timeout)
+        except requests.exceptions.Timeout:
+            raise CeiConnectionError("timed out")
+        except requests.exceptions.ConnectionError as e:
+            raise CeiConnectionError(e)
+        finally:
+            self._release_session()
+        if result.status_code in GATEWAY_UNAVAILABLE_STATUSES:
+            raise CeiConnectionError("gateway returned HTTP %s" % result.status_code)
         result_json = result.json()
         try:
             return result_json['data']['GatewayResponse']
@@ -230,4 +458,5 @@ class PyonHTTPGateWayCeiConnection(CeiConnection):
         pass
 
     def disconnect(self):
-        pass
+        self._shutdown_async()
+        self.session.close()
@@ -1,2 +1,26 @@
 class CeiClientError(Exception):
     pass
+
+
+class CeiConnectionError(CeiClientError):
+    """A service couldn't be reached, or didn't reply in time
+    """
+    pass
+
+
+class CircuitOpenError(CeiClientError):
+    """Calls to a service are failing fast after it failed repeatedly
+    """
+    pass
+
+
+class WaitTimeoutError(CeiClientError):
+    """Waiting on something to reach a state took longer than allowed
+    """
+    pass
+
+
+class OperationNotSupportedError(CeiClientError):
+    """The service (or the client for it) doesn't implement an operation
+    """
+    pass
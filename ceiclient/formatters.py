@@ -0,0 +1,179 @@
+import errno
+import json
+import sys
+import types
+
+from ceiclient.common import PYON_PROCESS_STATE_MAP
+
+FORMATS = ('table', 'tsv', 'ndjson')
+
+# Output is written to the stream in chunks of about this many bytes
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+class Column(object):
+    """A column of tabular output
+
+    key is the name of the row field shown in the column, or a function
+    returning the value from a row. A key of None shows the row itself,
+    for listings of plain names. width is the minimum width of the column
+    in table output; longer values aren't truncated.
+    """
+
+    def __init__(self, name, width, key=None):
+        self.name = name
+        self.width = width
+        if key is None:
+            self.value = lambda row: row
+        elif callable(key):
+            self.value = key
+        else:
+            self.value = lambda row: row.get(key) if isinstance(row, dict) else None
+
+
+def _first_of(*keys):
+    def value(row):
+        for key in keys:
+            if row.get(key) is not None:
+                return row[key]
+        return None
+    return value
+
+
+def _detail_or(key):
+    # processes from the service gateway keep these under detail
+    def value(row):
+        if row.get(key) is not None:
+            return row[key]
+        detail = row.get('detail')
+        if isinstance(detail, dict):
+            return detail.get(key)
+        return None
+    return value
+
+
+def _process_state(row):
+    # processes from the service gateway only have an integer process_state,
+    # which is mapped the same way PDDescribeProcess.extract_details does
+    if row.get('state') is None and row.get('process_state') is not None:
+        return PYON_PROCESS_STATE_MAP.get(int(row['process_state']))
+    return row.get('state')
+
+
+def _name_or(key):
+    def value(row):
+        if isinstance(row, dict):
+            return row.get(key) or row.get('name')
+        return row
+    return value
+
+
+PROCESS_COLUMNS = (
+    Column('upid', 36, _first_of('upid', 'process_id')),
+    Column('name', 24, 'name'),
+    Column('state', 16, _process_state),
+    Column('hostname', 24, _detail_or('hostname')),
+    Column('assigned', 24, _detail_or('assigned')),
+)
+
+DOMAIN_COLUMNS = (
+    Column('domain_id', 32),
+)
+
+DOMAIN_DEFINITION_COLUMNS = (
+    Column('definition_id', 32),
+)
+
+PROCESS_DEFINITION_COLUMNS = (
+    Column('definition_id', 36, _name_or('definition_id')),
+)
+
+NODE_COLUMNS = (
+    Column('node_id', 36, 'node_id'),
+    Column('state', 16, 'state'),
+    Column('site', 16, 'site'),
+    Column('allocation', 12, 'allocation'),
+    Column('public_ip', 16, 'public_ip'),
+    Column('hostname', 32, 'hostname'),
+)
+
+
+def _text(value):
+    if value is None:
+        return ''
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return str(value)
+
+
+def _table_line(values, columns):
+    return '  '.join(_text(v).ljust(c.width) for v, c in zip(values, columns)).rstrip() + '\n'
+
+
+def _tsv_field(value):
+    return _text(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n')
+
+
+def format_rows(rows, columns, format):
+    """Yield the lines of rows shown in format, one of FORMATS
+
+    Rows are consumed one at a time, so a generator of rows is never
+    held in memory whole.
+    """
+    if format == 'table':
+        yield _table_line([c.name.upper() for c in columns], columns)
+        for row in rows:
+            yield _table_line([c.value(row) for c in columns], columns)
+    elif format == 'tsv':
+        yield '\t'.join(c.name for c in columns) + '\n'
+        for row in rows:
+            yield '\t'.join(_tsv_field(c.value(row)) for c in columns) + '\n'
+    elif format == 'ndjson':
+        for row in rows:
+            yield json.dumps(dict((c.name, c.value(row)) for c in columns),
+                    separators=(',', ':'), default=repr) + '\n'
+    else:
+        raise ValueError("unknown format %s" % format)
+
+
+def format_ndjson(result):
+    """Yield one compact JSON line per element of a listing
+
+    Listings (lists, tuples and generators) are consumed one element at a
+    time; any other result is written as a single line.
+    """
+    if not isinstance(result, (list, tuple, types.GeneratorType)):
+        result = [result]
+    for element in result:
+        yield json.dumps(element, separators=(',', ':'), default=repr) + '\n'
+
+
+def write_chunked(lines, stream=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Write lines to stream (stdout by default) in chunks of about chunk_size
+
+    Like safe_print, exits quietly when the reader goes away (e.g. head).
+    """
+    if stream is None:
+        stream = sys.stdout
+    try:
+        chunk = []
+        size = 0
+        for line in lines:
+            chunk.append(line)
+            size += len(line)
+            if size >= chunk_size:
+                stream.write(''.join(chunk))
+                chunk = []
+                size = 0
+        if chunk:
+            stream.write(''.join(chunk))
+        stream.flush()
+    except IOError, e:
+        if e.errno == errno.EPIPE:
+            sys.exit(0)
+        else:
+            raise
+
+
+def write_rows(rows, columns, format, stream=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    write_chunked(format_rows(rows, columns, format), stream, chunk_size)
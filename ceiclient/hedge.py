@@ -0,0 +1,115 @@
+import collections
+import threading
+import time
+
+from ceiclient.concurrency import DEFAULT_MAX_WORKERS, FutureTimeout, WorkerPool, as_completed
+from ceiclient.instrumentation import percentile
+from ceiclient.retry import is_idempotent
+
+# Operations hedged by default, by the operation name sent to the service
+DEFAULT_HEDGED_OPERATIONS = ('describe_process', 'describe_domain', 'read_process')
+
+DEFAULT_HEDGE_PERCENTILE = 95
+# Delay used until enough replies were timed to derive one
+DEFAULT_HEDGE_DELAY = 0.5
+DEFAULT_MIN_SAMPLES = 20
+# Number of recent reply times kept per operation
+DEFAULT_WINDOW = 500
+
+
+class HedgingConnection(object):
+    """Connection wrapper sending a second copy of slow read requests
+
+    If a call to one of operations hasn't had a reply after the delay
+    within which percentile % of its recent calls replied, the same
+    request is sent again, and whichever reply arrives first is returned.
+    That cuts the tail latency caused by a request stuck behind others
+    (or lost), for at most a few % more requests. Any client can be given
+    one in place of its connection:
+
+        pd = PDClient(HedgingConnection(connection))
+
+    Both copies run through the wrapped connection's call_async, each
+    waiting on its own reply. The slower one isn't cancelled; its reply is
+    discarded. Only idempotent operations can be hedged.
+    """
+
+    def __init__(self, connection, operations=DEFAULT_HEDGED_OPERATIONS,
+            percentile=DEFAULT_HEDGE_PERCENTILE, initial_delay=DEFAULT_HEDGE_DELAY,
+            min_samples=DEFAULT_MIN_SAMPLES, window=DEFAULT_WINDOW):
+        for operation in operations:
+            if not is_idempotent(operation):
+                raise ValueError("%s isn't idempotent and can't be hedged" % operation)
+        self.connection = connection
+        self.operations = frozenset(operations)
+        self.percentile = percentile
+        self.initial_delay = initial_delay
+        self.min_samples = min_samples
+        self.window = window
+        self.hedged = 0
+        self._durations = {}
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def __getattr__(self, name):
+        return getattr(self.connection, name)
+
+    def delay(self, service, operation):
+        """Seconds to wait for a reply before sending the request again
+        """
+        with self._lock:
+            durations = self._durations.get((service, operation))
+            if durations is None or len(durations) < self.min_samples:
+                return self.initial_delay
+            durations = sorted(durations)
+        return percentile(durations, self.percentile)
+
+    def _timed_call(self, service, operation, kwargs):
+        start = time.time()
+        result = self.connection.call(service, operation, **kwargs)
+        with self._lock:
+            durations = self._durations.get((service, operation))
+            if durations is None:
+                durations = self._durations[(service, operation)] = collections.deque(maxlen=self.window)
+            durations.append(time.time() - start)
+        return result
+
+    def call(self, service, operation, **kwargs):
+        if operation not in self.operations:
+            return self.connection.call(service, operation, **kwargs)
+
+        first = self.connection.submit(self._timed_call, service, operation, kwargs)
+        try:
+            return first.result(self.delay(service, operation))
+        except FutureTimeout:
+            pass
+
+        with self._lock:
+            self.hedged += 1
+        second = self.connection.submit(self._timed_call, service, operation, kwargs)
+
+        failed = None
+        for future in as_completed([first, second]):
+            if future.exception() is None:
+                return future.result()
+            failed = future
+        return failed.result()
+
+    def call_async(self, service, operation, **kwargs):
+        return self.submit(self.call, service, operation, **kwargs)
+
+    def submit(self, func, *args, **kwargs):
+        # Calls waiting on their hedges get their own workers: running them
+        # on the wrapped connection's would leave none for the hedges
+        with self._lock:
+            if self._pool is None:
+                self._pool = WorkerPool(DEFAULT_MAX_WORKERS)
+            pool = self._pool
+        return pool.submit(func, *args, **kwargs)
+
+    def disconnect(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown()
+        self.connection.disconnect()
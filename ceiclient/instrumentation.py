@@ -0,0 +1,164 @@
+import json
+import math
+import threading
+import time
+
+# Percentiles reported by HistogramCollector.summary
+DEFAULT_PERCENTILES = (50, 95, 99)
+
+_current = threading.local()
+
+
+class CallRecord(object):
+    """What is known about one call to a service
+
+    duration is set once the call returns, result if it returned, error if
+    it raised, and retries counts the attempts that failed and were made
+    again.
+    """
+
+    def __init__(self, service, operation, kwargs):
+        self.service = service
+        self.operation = operation
+        self.kwargs = kwargs
+        self.start = time.time()
+        self.duration = None
+        self.retries = 0
+        self.error = None
+        self.result = None
+        self._returned = False
+        self._request_size = None
+        self._response_size = None
+
+    @property
+    def request_size(self):
+        """Approximate size in bytes of the request's arguments
+        """
+        if self._request_size is None:
+            self._request_size = len(json.dumps(self.kwargs, default=repr))
+        return self._request_size
+
+    @property
+    def response_size(self):
+        """Approximate size in bytes of the reply, or None before there is one
+        """
+        if self._response_size is None and self._returned:
+            self._response_size = len(json.dumps(self.result, default=repr))
+        return self._response_size
+
+
+class Instrument(object):
+    """Receives a call to one of its hooks at each step of every call
+
+    Subclasses override the hooks they are interested in. Hooks are run
+    in the calling thread, so they should be quick, and an exception in
+    one of them fails the call.
+    """
+
+    def before_call(self, record):
+        pass
+
+    def after_call(self, record):
+        pass
+
+    def on_error(self, record):
+        pass
+
+    def on_retry(self, record):
+        pass
+
+
+def current_call():
+    """Return the CallRecord of the call being made in this thread, if any
+    """
+    return getattr(_current, 'record', None)
+
+
+def instrumented_call(instruments, call, service, operation, kwargs):
+    """Make call(service, operation, **kwargs), running instruments' hooks
+    """
+    record = CallRecord(service, operation, kwargs)
+    for instrument in instruments:
+        instrument.before_call(record)
+
+    previous = current_call()
+    _current.record = record
+    try:
+        result = call(service, operation, **kwargs)
+    except Exception as e:
+        record.duration = time.time() - record.start
+        record.error = e
+        for instrument in instruments:
+            instrument.on_error(record)
+        raise
+    finally:
+        _current.record = previous
+
+    record.duration = time.time() - record.start
+    record.result = result
+    record._returned = True
+    for instrument in instruments:
+        instrument.after_call(record)
+    return result
+
+
+def record_retry(instruments, error):
+    """Count a retry of the call being made in this thread
+    """
+    record = current_call()
+    if record is None:
+        return
+    record.retries += 1
+    record.error = error
+    for instrument in instruments:
+        instrument.on_retry(record)
+
+
+class HistogramCollector(Instrument):
+    """Keeps the duration of every call, by service and operation
+    """
+
+    def __init__(self):
+        self._durations = {}
+        self._errors = {}
+        self._lock = threading.Lock()
+
+    def _add(self, record, errors):
+        key = (record.service, record.operation)
+        with self._lock:
+            self._durations.setdefault(key, []).append(record.duration)
+            self._errors[key] = self._errors.get(key, 0) + errors
+
+    def after_call(self, record):
+        self._add(record, 0)
+
+    def on_error(self, record):
+        self._add(record, 1)
+
+    def durations(self, service, operation):
+        with self._lock:
+            return list(self._durations.get((service, operation), []))
+
+    def percentile(self, service, operation, percent):
+        """Return the duration under which percent % of the calls completed
+        """
+        return percentile(sorted(self.durations(service, operation)), percent)
+
+    def summary(self, percents=DEFAULT_PERCENTILES):
+        """Return (service, operation, calls, errors, [percentiles]) per operation
+        """
+        with self._lock:
+            items = sorted((key, sorted(durations)) for key, durations in self._durations.items())
+            errors = dict(self._errors)
+        return [(service, operation, len(durations), errors.get((service, operation), 0),
+                    [percentile(durations, p) for p in percents])
+                for (service, operation), durations in items]
+
+
+def percentile(ordered, percent):
+    """Nearest-rank percentile of a sorted list, or None if it is empty
+    """
+    if not ordered:
+        return None
+    rank = int(math.ceil(percent / 100.0 * len(ordered)))
+    return ordered[max(rank, 1) - 1]
@@ -0,0 +1,180 @@
+import re
+import socket
+import threading
+
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+from ceiclient.instrumentation import Instrument
+
+DEFAULT_STATSD_HOST = 'localhost'
+DEFAULT_STATSD_PORT = 8125
+DEFAULT_PREFIX = 'ceiclient'
+
+# Upper bounds, in seconds, of the Prometheus call duration buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class StatsdExporter(Instrument):
+    """Sends RPC counts, latencies, errors and retries to StatsD over UDP
+
+    Metrics are named <prefix>.<service>.<operation>.<metric>, where metric
+    is one of calls, errors, retries (counters) or latency (a timer, in
+    milliseconds). Packets that can't be sent are dropped: metrics must
+    never fail a call.
+    """
+
+    def __init__(self, host=DEFAULT_STATSD_HOST, port=DEFAULT_STATSD_PORT, prefix=DEFAULT_PREFIX):
+        self.address = (host, port)
+        self.prefix = prefix
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def _name(self, record, metric):
+        return '.'.join(_statsd_safe(part) for part in
+                (self.prefix, record.service, record.operation, metric))
+
+    def _send(self, *lines):
+        try:
+            self._socket.sendto('\n'.join(lines), self.address)
+        except socket.error:
+            pass
+
+    def after_call(self, record):
+        self._send('%s:1|c' % self._name(record, 'calls'),
+                '%s:%.3f|ms' % (self._name(record, 'latency'), record.duration * 1000))
+
+    def on_error(self, record):
+        self._send('%s:1|c' % self._name(record, 'calls'),
+                '%s:1|c' % self._name(record, 'errors'),
+                '%s:%.3f|ms' % (self._name(record, 'latency'), record.duration * 1000))
+
+    def on_retry(self, record):
+        self._send('%s:1|c' % self._name(record, 'retries'))
+
+    def close(self):
+        self._socket.close()
+
+
+def _statsd_safe(name):
+    return re.sub(r'[^A-Za-z0-9_\-]', '_', str(name))
+
+
+class PrometheusExporter(Instrument):
+    """Keeps RPC counts, latencies, errors and retries for Prometheus to scrape
+
+    render() returns them in the Prometheus text exposition format, and
+    serve() starts a thread answering scrapes of /metrics with it.
+    """
+
+    def __init__(self, prefix=DEFAULT_PREFIX, buckets=DEFAULT_BUCKETS):
+        self.prefix = prefix
+        self.buckets = tuple(sorted(buckets))
+        self._operations = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    def _operation(self, record):
+        key = (record.service, record.operation)
+        operation = self._operations.get(key)
+        if operation is None:
+            operation = self._operations[key] = {
+                'calls': 0, 'errors': 0, 'retries': 0, 'duration_sum': 0.0,
+                'buckets': [0] * len(self.buckets)}
+        return operation
+
+    def _observe(self, record, error):
+        with self._lock:
+            operation = self._operation(record)
+            operation['calls'] += 1
+            operation['errors'] += error
+            operation['duration_sum'] += record.duration
+            for i, bound in enumerate(self.buckets):
+                if record.duration <= bound:
+                    operation['buckets'][i] += 1
+
+    def after_call(self, record):
+        self._observe(record, 0)
+
+    def on_error(self, record):
+        self._observe(record, 1)
+
+    def on_retry(self, record):
+        with self._lock:
+            self._operation(record)['retries'] += 1
+
+    def render(self):
+        with self._lock:
+            operations = sorted((key, dict(value, buckets=list(value['buckets'])))
+                    for key, value in self._operations.items())
+
+        lines = []
+
+        def counter(metric, help, field):
+            name = '%s_%s' % (self.prefix, metric)
+            lines.append('# HELP %s %s' % (name, help))
+            lines.append('# TYPE %s counter' % name)
+            for (service, operation), values in operations:
+                lines.append('%s{%s} %d' % (name, _labels(service, operation), values[field]))
+
+        counter('calls_total', 'Calls made to CEI services.', 'calls')
+        counter('errors_total', 'Calls to CEI services that failed.', 'errors')
+        counter('retries_total', 'Calls to CEI services that were retried.', 'retries')
+
+        name = '%s_call_duration_seconds' % self.prefix
+        lines.append('# HELP %s Duration of calls to CEI services.' % name)
+        lines.append('# TYPE %s histogram' % name)
+        for (service, operation), values in operations:
+            labels = _labels(service, operation)
+            for bound, count in zip(self.buckets, values['buckets']):
+                lines.append('%s_bucket{%s,le="%s"} %d' % (name, labels, _float(bound), count))
+            lines.append('%s_bucket{%s,le="+Inf"} %d' % (name, labels, values['calls']))
+            lines.append('%s_sum{%s} %s' % (name, labels, _float(values['duration_sum'])))
+            lines.append('%s_count{%s} %d' % (name, labels, values['calls']))
+
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, port, host=''):
+        """Answer scrapes of http://host:port/metrics from a daemon thread
+
+        Returns the port actually listened on (useful with port 0).
+        """
+        exporter = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = exporter.render()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = HTTPServer((host, port), MetricsHandler)
+        thread = threading.Thread(target=self._server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self._server.server_address[1]
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+def _labels(service, operation):
+    return 'service="%s",operation="%s"' % (_escape(service), _escape(operation))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _float(value):
+    return repr(float(value))
@@ -0,0 +1,78 @@
+import time
+
+from ceiclient.backoff import DEFAULT_JITTER, Backoff
+from ceiclient.exception import CeiConnectionError
+
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_RETRY_INTERVAL = 0.1
+DEFAULT_MAX_RETRY_INTERVAL = 2.0
+
+# Operations that only read state, and so can safely be sent again when
+# their reply is lost
+IDEMPOTENT_PREFIXES = ('describe', 'list_', 'read_', 'status', 'rcmd_status', 'dump')
+
+
+def is_idempotent(operation):
+    return operation.startswith(IDEMPOTENT_PREFIXES)
+
+
+def is_transient(error):
+    """Whether error may go away if the call is made again
+    """
+    return isinstance(error, CeiConnectionError)
+
+
+class RetryPolicy(object):
+    """When and how often a connection makes a failed call again
+
+    A call is made up to max_attempts times if its operation is idempotent
+    and it failed with an error that retryable accepts; other calls are
+    made once. Attempts are spaced by an exponential backoff (see
+    ceiclient.backoff.Backoff), and no retry is started that would wait
+    past deadline seconds after the first attempt.
+    """
+
+    def __init__(self, max_attempts=DEFAULT_MAX_ATTEMPTS, initial=DEFAULT_RETRY_INTERVAL,
+            max_interval=DEFAULT_MAX_RETRY_INTERVAL, jitter=DEFAULT_JITTER, deadline=None,
+            retryable=is_transient, idempotent=is_idempotent):
+        if max_attempts < 1:
+            raise ValueError("max_attempts must be at least 1")
+        self.max_attempts = max_attempts
+        self.backoff = Backoff(initial, max_interval, jitter=jitter)
+        self.deadline = deadline
+        self.retryable = retryable
+        self.idempotent = idempotent
+
+    def attempts(self, operation):
+        if self.idempotent(operation):
+            return self.max_attempts
+        return 1
+
+    def call(self, func, service, operation, kwargs, on_retry=None):
+        """Return func(service, operation, **kwargs), retrying as allowed
+
+        on_retry is called with the error of each attempt that is retried.
+        The error of the last attempt is raised.
+        """
+        attempts = self.attempts(operation)
+        if self.deadline is not None:
+            deadline = time.time() + self.deadline
+        intervals = self.backoff.intervals()
+
+        attempt = 1
+        while True:
+            try:
+                return func(service, operation, **kwargs)
+            except Exception as e:
+                if attempt >= attempts or not self.retryable(e):
+                    raise
+                interval = next(intervals)
+                if self.deadline is not None and time.time() + interval > deadline:
+                    raise
+                if on_retry is not None:
+                    on_retry(e)
+            time.sleep(interval)
+            attempt += 1
+
+
+NO_RETRY = RetryPolicy(max_attempts=1)
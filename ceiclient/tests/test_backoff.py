@@ -0,0 +1,49 @@
+import unittest
+
+from mock import Mock, patch
+
+from ceiclient.backoff import Backoff, wait_for
+from ceiclient.exception import CeiClientError
+
+
+class TestBackoff(unittest.TestCase):
+
+    def test_intervals_without_jitter(self):
+        intervals = Backoff(0.1, max_interval=1, jitter=0).intervals()
+        self.assertEqual([round(next(intervals), 3) for _ in range(6)],
+            [0.1, 0.2, 0.4, 0.8, 1, 1])
+
+    def test_jitter_bounds(self):
+        intervals = Backoff(1, max_interval=1, jitter=0.5).intervals()
+        for _ in range(100):
+            interval = next(intervals)
+            self.assertTrue(0.5 <= interval <= 1)
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, Backoff, -1)
+        self.assertRaises(ValueError, Backoff, 1, jitter=2)
+
+
+class TestWaitFor(unittest.TestCase):
+
+    def test_returns_result(self):
+        check = Mock(side_effect=[None, None, "READY"])
+        with patch('ceiclient.backoff.time.sleep', return_value=None) as sleep:
+            self.assertEqual(wait_for(check, 60, Backoff(1, jitter=0), "timed out"), "READY")
+        self.assertEqual([c[0][0] for c in sleep.call_args_list], [1, 2])
+
+    def test_timeout(self):
+        check = Mock(return_value=None)
+        try:
+            wait_for(check, 0.05, Backoff(0.01, max_interval=0.02), "timed out")
+        except CeiClientError as e:
+            self.assertEqual(str(e), "timed out")
+        else:
+            self.fail("expected CeiClientError")
+        self.assertTrue(check.call_count > 1)
+
+    def test_wait_can_return_result(self):
+        check = Mock(return_value=None)
+        wait = Mock(side_effect=[None, "notified"])
+        self.assertEqual(wait_for(check, 60, Backoff(1), "timed out", wait=wait), "notified")
+        self.assertEqual(check.call_count, 2)
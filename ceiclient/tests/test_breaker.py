@@ -0,0 +1,116 @@
+import unittest
+
+from ceiclient.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitBreakers
+from ceiclient.connection import CeiConnection
+from ceiclient.exception import CeiClientError, CeiConnectionError, CircuitOpenError
+from ceiclient.retry import NO_RETRY
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class DownConnection(CeiConnection):
+
+    retry_policy = NO_RETRY
+
+    def __init__(self, circuit_breakers):
+        self._circuit_breakers = circuit_breakers
+        self.down = set()
+        self.calls = 0
+
+    def _call(self, service, operation, **kwargs):
+        self.calls += 1
+        if service in self.down:
+            raise CeiConnectionError("timed out")
+        if operation == 'missing':
+            raise CeiClientError("NotFound")
+        return 'ok'
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def test_opens_and_probes(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker('pd', failure_threshold=2, reset_timeout=10, clock=clock)
+        breaker.record_failure()
+        breaker.before_call()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, OPEN)
+        self.assertRaises(CircuitOpenError, breaker.before_call)
+
+        clock.now += 10
+        breaker.before_call()
+        self.assertEqual(breaker.state, HALF_OPEN)
+        # only one probe at a time
+        self.assertRaises(CircuitOpenError, breaker.before_call)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, OPEN)
+
+        clock.now += 10
+        breaker.before_call()
+        breaker.record_success()
+        self.assertEqual(breaker.state, CLOSED)
+        breaker.before_call()
+
+    def test_stuck_probe_expires(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker('pd', failure_threshold=1, reset_timeout=10, clock=clock)
+        breaker.record_failure()
+        clock.now += 10
+        breaker.before_call()
+        self.assertRaises(CircuitOpenError, breaker.before_call)
+        clock.now += 10
+        breaker.before_call()
+        self.assertEqual(breaker.state, HALF_OPEN)
+
+    def test_interrupted_probe(self):
+        clock = FakeClock()
+        breakers = CircuitBreakers(failure_threshold=1, reset_timeout=10, clock=clock)
+        breakers.breaker('pd').record_failure()
+        clock.now += 10
+
+        def interrupted(service, operation):
+            raise KeyboardInterrupt()
+        self.assertRaises(KeyboardInterrupt, breakers.call, interrupted, 'pd', 'describe', {})
+        self.assertEqual(breakers.call(lambda service, operation: 'ok', 'pd', 'describe', {}), 'ok')
+        self.assertEqual(breakers.breaker('pd').state, CLOSED)
+
+
+class TestConnectionBreakers(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.conn = DownConnection(CircuitBreakers(failure_threshold=3, reset_timeout=30, clock=self.clock))
+
+    def test_fails_fast_per_service(self):
+        self.conn.down.add('pd')
+        for _ in range(3):
+            self.assertRaises(CeiConnectionError, self.conn.call, 'pd', 'describe_process')
+        self.assertRaises(CircuitOpenError, self.conn.call, 'pd', 'describe_process')
+        self.assertEqual(self.conn.calls, 3)
+
+        # other services are unaffected
+        self.assertEqual(self.conn.call('epum', 'list_domains'), 'ok')
+
+        self.conn.down.clear()
+        self.clock.now += 30
+        self.assertEqual(self.conn.call('pd', 'describe_process'), 'ok')
+        self.assertEqual(self.conn.call('pd', 'describe_process'), 'ok')
+
+    def test_service_errors_are_not_failures(self):
+        for _ in range(5):
+            self.assertRaises(CeiClientError, self.conn.call, 'pd', 'missing')
+        self.assertEqual(self.conn.circuit_breakers.breaker('pd').state, CLOSED)
+
+    def test_shared_between_connections(self):
+        other = DownConnection(self.conn.circuit_breakers)
+        other.down.add('pd')
+        for _ in range(3):
+            self.assertRaises(CeiConnectionError, other.call, 'pd', 'describe_process')
+        self.assertRaises(CircuitOpenError, self.conn.call, 'pd', 'describe_process')
@@ -0,0 +1,122 @@
+import threading
+import unittest
+
+from mock import Mock
+
+from ceiclient.cache import CachingConnection, TTLCache
+from ceiclient.client import DTRSClient, PDClient
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTTLCache(unittest.TestCase):
+
+    def test_expiry(self):
+        clock = FakeClock()
+        cache = TTLCache(clock=clock)
+        cache.set('a', 1, 10)
+        self.assertEqual(cache.get('a'), 1)
+        clock.now += 10
+        self.assertEqual(cache.get('a'), None)
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_lru_eviction(self):
+        cache = TTLCache(maxsize=2)
+        cache.set('a', 1, 10)
+        cache.set('b', 2, 10)
+        cache.get('a')
+        cache.set('c', 3, 10)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+
+class TestCachingConnection(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.conn = Mock()
+        self.conn.call.side_effect = lambda service, operation, **kwargs: {'op': operation}
+        self.caching = CachingConnection(self.conn, clock=self.clock)
+        self.dtrs = DTRSClient(self.caching)
+
+    def test_reads_are_cached(self):
+        self.assertEqual(self.dtrs.describe_dt('alice', 'dt1'), {'op': 'describe_dt'})
+        self.assertEqual(self.dtrs.describe_dt('alice', 'dt1'), {'op': 'describe_dt'})
+        self.assertEqual(self.conn.call.call_count, 1)
+        self.assertEqual(self.caching.stats()['hits'], 1)
+
+        self.dtrs.describe_dt('alice', 'dt2')
+        self.dtrs.list_dts('alice')
+        self.dtrs.list_dts('alice')
+        self.assertEqual(self.conn.call.call_count, 4)
+
+        self.clock.now += 60
+        self.dtrs.describe_dt('alice', 'dt1')
+        self.assertEqual(self.conn.call.call_count, 5)
+
+    def test_results_are_copies(self):
+        self.dtrs.describe_site('alice', 'site1')['op'] = 'changed'
+        self.assertEqual(self.dtrs.describe_site('alice', 'site1'), {'op': 'describe_site'})
+
+    def test_mutation_invalidates_matching_entries(self):
+        self.dtrs.describe_dt('alice', 'dt1')
+        self.dtrs.describe_dt('alice', 'dt2')
+        self.dtrs.list_sites('alice')
+        self.dtrs.update_dt('alice', 'dt1', {})
+        self.conn.call.reset_mock()
+
+        self.dtrs.describe_dt('alice', 'dt1')
+        self.dtrs.describe_dt('alice', 'dt2')
+        self.dtrs.list_sites('alice')
+        operations = [c[0][1] for c in self.conn.call.call_args_list]
+        self.assertEqual(operations, ['describe_dt', 'list_sites'])
+        self.assertEqual(self.conn.call.call_args_list[0][1]['dt_name'], 'dt1')
+
+    def test_nested_args_invalidate(self):
+        pd = PDClient(self.caching)
+        pd.describe_process_definition(process_definition_id='pd1')
+        pd.describe_process_definition(process_definition_id='pd2')
+        pd.update_process_definition({'name': 'x'}, 'pd1')
+        self.conn.call.reset_mock()
+
+        pd.describe_process_definition(process_definition_id='pd1')
+        pd.describe_process_definition(process_definition_id='pd2')
+        self.assertEqual(self.conn.call.call_count, 1)
+        self.assertEqual(self.conn.call.call_args[1]['definition_id'], 'pd1')
+
+    def test_read_during_mutation_not_cached(self):
+        started = threading.Event()
+        release = threading.Event()
+        store = {'dt1': 'old'}
+
+        def call(service, operation, **kwargs):
+            if operation == 'update_dt':
+                started.set()
+                release.wait(5)
+                store['dt1'] = 'new'
+                return None
+            return store['dt1']
+        self.conn.call.side_effect = call
+
+        updater = threading.Thread(target=self.dtrs.update_dt, args=('alice', 'dt1', {}))
+        updater.start()
+        self.assertTrue(started.wait(5))
+        # the update hasn't taken effect yet, so this read gets the old value
+        self.assertEqual(self.dtrs.describe_dt('alice', 'dt1'), 'old')
+        release.set()
+        updater.join(5)
+
+        self.assertEqual(self.dtrs.describe_dt('alice', 'dt1'), 'new')
+        self.assertEqual(self.dtrs.describe_dt('alice', 'dt1'), 'new')
+        operations = [c[0][1] for c in self.conn.call.call_args_list]
+        self.assertEqual(operations, ['update_dt', 'describe_dt', 'describe_dt'])
@@ -0,0 +1,141 @@
+import json
+import subprocess
+import sys
+import yaml
+
+from mock import Mock, patch
+from StringIO import StringIO
+from nose.tools import raises
+
+from ceiclient.cli import (build_parser, get_services, requested_command,
+        requested_session, run_command, run_session, SHELL, SCRIPT)
+from ceiclient.exception import CeiClientError
+from ceiclient.commands import DASHI_SERVICES, PYON_SERVICES, PYON_GATEWAY_SERVICES
+
+
+class TestLazyRegistration:
+
+    def test_requested_command(self):
+        argv = ['-b', 'broker', '-t', '10', 'process', 'describe', 'pid1']
+        assert requested_command(DASHI_SERVICES, argv) == ('process', 'describe')
+
+    def test_requested_command_service_only(self):
+        assert requested_command(DASHI_SERVICES, ['process', '-h']) == ('process', None)
+
+    def test_requested_command_unknown(self):
+        assert requested_command(DASHI_SERVICES, ['-h']) == (None, None)
+        assert requested_command(DASHI_SERVICES, ['nosuchservice', 'list']) == (None, None)
+        assert requested_command(DASHI_SERVICES, ['-t', 'notanint', 'process', 'list']) == (None, None)
+
+    def test_only_requested_command_registered(self):
+        argv = ['process', 'describe', 'pid1']
+        opts = build_parser(DASHI_SERVICES, argv).parse_args(argv)
+        assert opts.service == 'process'
+        assert opts.command == 'describe'
+        assert opts.process_id == 'pid1'
+
+    @raises(SystemExit)
+    def test_other_commands_not_registered(self):
+        build_parser(DASHI_SERVICES, ['process', 'describe', 'pid1']).parse_args(['process', 'list'])
+
+    def test_everything_registered_without_command(self):
+        parser = build_parser(DASHI_SERVICES, [])
+        for service_name in DASHI_SERVICES:
+            assert service_name in parser.format_help()
+        opts = parser.parse_args(['domain', 'list'])
+        assert opts.service == 'domain'
+        opts = parser.parse_args(['process', 'list'])
+        assert opts.service == 'process'
+
+    def test_get_services(self):
+        assert get_services(['-P', 'process', 'list']) is PYON_SERVICES
+        assert get_services(['-G', 'process', 'list']) is PYON_GATEWAY_SERVICES
+        assert get_services(['process', 'list']) is DASHI_SERVICES
+
+    def test_import_is_lightweight(self):
+        code = ("import sys, ceiclient.cli\n"
+                "print sorted(m for m in ('dashi', 'jinja2', 'yaml', 'requests') if m in sys.modules)\n")
+        output = subprocess.check_output([sys.executable, '-c', code])
+        assert output.strip() == '[]', output
+
+
+class TestSession:
+
+    def setup(self):
+        self.conn = Mock()
+        self.conn.call.return_value = []
+
+    def test_requested_session(self):
+        assert requested_session(['-J', 'shell']) == (['-J'], SHELL)
+        assert requested_session(['-b', 'h', '-f', 'cmds.txt']) == (['-b', 'h', '-f', 'cmds.txt'], SCRIPT)
+        assert requested_session(['process', 'wait', '-f', 'upids.txt'])[1] is None
+
+    @raises(CeiClientError)
+    def test_script_with_command(self):
+        requested_session(['-f', 'cmds.txt', 'process', 'list'])
+
+    def test_commands_share_connection(self):
+        lines = enumerate(['# comment', '', 'domain list', 'process describe "p 1"'], 1)
+        run_session(DASHI_SERVICES, self.conn, ['-Y'], lines, 'cmds.txt')
+
+        calls = self.conn.call.call_args_list
+        assert len(calls) == 2
+        assert calls[0][0][:2] == ('epu_management_service', 'list_domains')
+        assert calls[1][0][:2] == ('process_dispatcher', 'describe_process')
+        assert calls[1][1]['upid'] == 'p 1'
+
+    def test_script_stops_at_first_error(self):
+        lines = enumerate(['domain list', 'domain nosuchcommand', 'domain list'], 1)
+        try:
+            run_session(DASHI_SERVICES, self.conn, [], lines, 'cmds.txt')
+        except CeiClientError as e:
+            assert 'cmds.txt, line 2' in str(e)
+        else:
+            assert False, "expected CeiClientError"
+        assert self.conn.call.call_count == 1
+
+    def test_shell_continues_after_error(self):
+        lines = enumerate(['domain nosuchcommand', 'domain list', 'exit', 'domain list'], 1)
+        run_session(DASHI_SERVICES, self.conn, [], lines, 'shell', interactive=True)
+        assert self.conn.call.call_count == 1
+
+    def run_listing(self, output):
+        # the client consumes each reply, so every run gets a fresh one
+        self.conn.call.side_effect = lambda *args, **kwargs: [dict(p) for p in self.processes]
+        with patch('sys.stdout', new_callable=StringIO) as stdout:
+            run_session(DASHI_SERVICES, self.conn, [output], enumerate(['process list'], 1), 'cmds.txt')
+        return stdout.getvalue()
+
+    def test_streamed_listing_dumped_whole(self):
+        self.processes = [{'upid': 'p1', 'name': 'web', 'state': '500-RUNNING'},
+            {'upid': 'p2', 'name': 'db', 'state': '200-REQUESTED'}]
+
+        assert json.loads(self.run_listing('-J')) == self.processes
+        assert yaml.safe_load(self.run_listing('-Y')) == self.processes
+        assert [json.loads(line) for line in self.run_listing('--ndjson').splitlines()] == self.processes
+        details = self.run_listing('-D')
+        assert 'Process ID    = p1' in details and 'Process ID    = p2' in details
+
+    def test_streamed_listing_error(self):
+        from dashi.exceptions import NotFoundError
+        self.conn.call.side_effect = NotFoundError("no such service")
+        for output in ([], ['-J'], ['--ndjson'], ['--format', 'tsv']):
+            argv = output + ['process', 'list']
+            opts = build_parser(DASHI_SERVICES, argv).parse_args(argv)
+            try:
+                with patch('sys.stdout', new_callable=StringIO):
+                    run_command(DASHI_SERVICES, self.conn, opts)
+            except CeiClientError as e:
+                assert 'no such service' in str(e)
+            else:
+                assert False, "expected CeiClientError"
+
+    def test_format(self):
+        self.conn.call.return_value = ['domain1']
+        run_session(DASHI_SERVICES, self.conn, ['--format', 'tsv'], enumerate(['domain list'], 1), 'cmds.txt')
+        try:
+            run_session(DASHI_SERVICES, self.conn, ['--format', 'tsv'], enumerate(['domain describe d1'], 1), 'cmds.txt')
+        except CeiClientError as e:
+            assert "--format isn't supported" in str(e)
+        else:
+            assert False, "expected CeiClientError"
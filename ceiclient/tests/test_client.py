@@ -37,3 +37,44 @@ class TestEPUMClient(unittest.TestCase):
 
         self.conn.call = Mock(return_value=None)
         self.assertEqual(self.epum_client.remove_domain_definition("definition"), None)
+
+
+class TestAsyncClient(unittest.TestCase):
+
+    def test_methods_return_futures(self):
+        from ceiclient.client import AsyncClient, AsyncPDClient, PDClient
+        from ceiclient.connection import CeiConnection
+
+        class FakeConnection(CeiConnection):
+            def call(self, service, operation, **kwargs):
+                return (service, operation, kwargs)
+
+        conn = FakeConnection()
+        pd = AsyncClient(PDClient(conn))
+        self.assertEqual(AsyncPDClient(conn).describe_processes().result(5),
+                ('process_dispatcher', 'describe_processes', {}))
+        future = pd.describe_process('p1')
+        self.assertEqual(future.result(5),
+                ('process_dispatcher', 'describe_process', {'upid': 'p1'}))
+        self.assertEqual(pd.dashi_name, 'process_dispatcher')
+        conn._shutdown_async()
+
+
+class TestIterProcesses(unittest.TestCase):
+
+    def test_pd_iter_processes(self):
+        from ceiclient.client import PDClient
+        conn = Mock()
+        conn.call.return_value = [{'upid': 'p1'}, {'upid': 'p2'}]
+        processes = PDClient(conn).iter_processes()
+        # nothing is requested until the first process is needed
+        self.assertFalse(conn.call.called)
+        self.assertEqual(next(processes), {'upid': 'p1'})
+        conn.call.assert_called_once_with('process_dispatcher', 'describe_processes')
+        self.assertEqual(list(processes), [{'upid': 'p2'}])
+
+    def test_iter_processes_no_reply(self):
+        from ceiclient.client import PDClient
+        conn = Mock()
+        conn.call.return_value = None
+        self.assertEqual(list(PDClient(conn).iter_processes()), [])
@@ -1,10 +1,16 @@
 from mock import Mock, patch
 from nose.tools import raises
 import argparse
+import os
 import pprint
+import shutil
+import tempfile
 
 from ceiclient.commands import AddDomain, DescribeDomain, ListDomains, \
-        ReconfigureDomain, RemoveDomain
+        ReconfigureDomain, RemoveDomain, PDSyncProcessDefinitions, \
+        PDScheduleProcess, PDScheduleProcessBatch, PDWaitProcess, \
+        PDDescribeProcesses, HAList
+from ceiclient.exception import CeiClientError, CeiConnectionError, OperationNotSupportedError
 
 
 class TestCommandParsing:
@@ -105,3 +111,472 @@ class TestCommandParsing:
     def test_command_parsing_epum_reconfigure_failing_wrong_arguments(self):
         ReconfigureDomain(self.subparsers)
         opts = self.parser.parse_args(['describe', 'domain1', 'notanumber'])
+
+
+class TestSyncProcessDefinitions:
+
+    definition_template = """
+name: %s
+executable:
+  exec: /bin/%s
+"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write_definition(self, name, executable=None):
+        path = os.path.join(self.tmpdir, "%s.yml" % name)
+        with open(path, 'w') as f:
+            f.write(self.definition_template % (name, executable or name))
+        return path
+
+    def test_sync(self):
+        from dashi.exceptions import NotFoundError
+
+        existing = {
+            'same': {'definition_id': 'id-same', 'executable': {'exec': '/bin/same'}},
+            'changed': {'definition_id': 'id-changed', 'executable': {'exec': '/bin/old'}},
+        }
+
+        def describe(process_definition_name):
+            if process_definition_name == 'broken':
+                raise Exception("PD fell over")
+            if process_definition_name not in existing:
+                raise NotFoundError("not found")
+            return existing[process_definition_name]
+
+        client = Mock()
+        client.list_process_definitions.side_effect = OperationNotSupportedError("can't list")
+        client.describe_process_definition.side_effect = describe
+
+        names = ['new', 'same', 'broken', 'changed']
+        opts = Mock(definitions=[self.write_definition(name) for name in names], workers=3, load_processes=None)
+        result = PDSyncProcessDefinitions.execute(client, opts)
+
+        assert result == [('new', 'CREATED'), ('same', 'OK'),
+            ('broken', 'FAILED: PD fell over'), ('changed', 'UPDATED')]
+        assert client.create_process_definition.call_count == 1
+        client.update_process_definition.assert_called_once_with(
+            process_definition={'name': 'changed', 'executable': {'exec': '/bin/changed'}},
+            process_definition_id='id-changed')
+        assert PDSyncProcessDefinitions.failed(result) == \
+            "1 of 4 process definitions failed to sync: broken"
+        assert PDSyncProcessDefinitions.failed(result[:2]) is None
+
+    def test_sync_prefetch(self):
+        client = Mock()
+        client.list_process_definitions.return_value = [
+            {'name': 'same', 'definition_id': 'id-same', 'executable': {'exec': '/bin/same'}},
+            {'name': 'changed', 'definition_id': 'id-changed', 'executable': {'exec': '/bin/old'}},
+        ]
+
+        names = ['new', 'same', 'changed']
+        opts = Mock(definitions=[self.write_definition(name) for name in names], workers=3, load_processes=None)
+        result = PDSyncProcessDefinitions.execute(client, opts)
+
+        assert result == [('new', 'CREATED'), ('same', 'OK'), ('changed', 'UPDATED')]
+        assert not client.describe_process_definition.called
+        assert client.create_process_definition.call_count == 1
+        assert client.update_process_definition.call_count == 1
+
+    def test_sync_listing_unknown_operation(self):
+        from dashi.exceptions import UnknownOperationError
+        client = Mock()
+        client.list_process_definitions.side_effect = UnknownOperationError("list_definitions")
+        client.describe_process_definition.return_value = {
+            'definition_id': 'id-same', 'executable': {'exec': '/bin/same'}}
+
+        opts = Mock(definitions=[self.write_definition('same')], workers=1, load_processes=None)
+        assert PDSyncProcessDefinitions.execute(client, opts) == [('same', 'OK')]
+
+    def test_sync_listing_connection_error(self):
+        client = Mock()
+        client.list_process_definitions.side_effect = CeiConnectionError("timed out")
+
+        names = ['new', 'same', 'changed']
+        opts = Mock(definitions=[self.write_definition(name) for name in names], workers=3, load_processes=None)
+        try:
+            PDSyncProcessDefinitions.execute(client, opts)
+        except CeiConnectionError as e:
+            assert str(e) == "timed out"
+        else:
+            assert False, "expected CeiConnectionError"
+        assert not client.describe_process_definition.called
+
+    def test_sync_listing_without_contents(self):
+        client = Mock()
+        client.list_process_definitions.return_value = ['id-same']
+        client.describe_process_definition.return_value = {
+            'definition_id': 'id-same', 'executable': {'exec': '/bin/same'}}
+
+        opts = Mock(definitions=[self.write_definition('same')], workers=1, load_processes=None)
+        assert PDSyncProcessDefinitions.execute(client, opts) == [('same', 'OK')]
+        client.describe_process_definition.assert_called_once_with(process_definition_name='same')
+
+
+class TestScheduleAndWait:
+
+    def schedule_opts(self, **kwargs):
+        opts = dict(id='proc1', definition_id='def1', definition_name=None,
+            config=None, execution_engine_id=None, queueing_mode=None,
+            restart_mode=None, wait=True, max=5, poll=1, max_poll=30)
+        opts.update(kwargs)
+        return Mock(**opts)
+
+    def test_schedule_wait_on_notification(self):
+        subscription = Mock(operation='process_state')
+        subscription.name = 'ceiclient_abc'
+        subscription.receive.side_effect = [
+            {'process': {'upid': 'other', 'state': '500-RUNNING'}},
+            {'process': {'upid': 'proc1', 'state': '400-PENDING'}},
+            {'process': {'upid': 'proc1', 'state': '500-RUNNING'}},
+        ]
+        client = Mock()
+        client.connection.subscribe.return_value = subscription
+        client.describe_process.return_value = {'upid': 'proc1', 'state': '200-REQUESTED'}
+
+        process = PDScheduleProcess.execute(client, self.schedule_opts())
+
+        assert process['state'] == '500-RUNNING'
+        assert client.schedule_process.call_args[1]['subscribers'] == [('ceiclient_abc', 'process_state')]
+        assert client.describe_process.call_count == 1
+        assert subscription.close.called
+
+    def test_schedule_wait_without_subscriptions(self):
+        client = Mock()
+        client.connection.subscribe.side_effect = CeiClientError("no subscriptions")
+        client.describe_process.side_effect = [
+            {'upid': 'proc1', 'state': '200-REQUESTED'},
+            {'upid': 'proc1', 'state': '850-FAILED'},
+        ]
+
+        with patch('ceiclient.backoff.time.sleep', return_value=None):
+            try:
+                PDScheduleProcess.execute(client, self.schedule_opts())
+            except CeiClientError as e:
+                assert '850-FAILED' in str(e)
+            else:
+                assert False, "expected CeiClientError"
+        assert client.schedule_process.call_args[1]['subscribers'] is None
+
+    def test_schedule_no_wait(self):
+        client = Mock()
+        client.schedule_process.return_value = {'upid': 'proc1'}
+        assert PDScheduleProcess.execute(client, self.schedule_opts(wait=False)) == {'upid': 'proc1'}
+        assert not client.connection.subscribe.called
+        assert not client.describe_process.called
+
+    def test_wait_timeout(self):
+        client = Mock()
+        client.describe_process.return_value = {'upid': 'proc1', 'state': '400-PENDING'}
+        opts = Mock(process_ids=['proc1'], process_id_file=None, max=0.05, poll=0.01, max_poll=0.02)
+        try:
+            PDWaitProcess.execute(client, opts)
+        except CeiClientError as e:
+            assert str(e) == "Timed out waiting for process proc1"
+        else:
+            assert False, "expected CeiClientError"
+
+    def test_wait_many(self):
+        client = Mock()
+        client.describe_processes.side_effect = [
+            [{'upid': 'p1', 'state': '500-RUNNING'}, {'upid': 'p2', 'state': '400-PENDING'},
+             {'upid': 'p3', 'state': '200-REQUESTED'}, {'upid': 'other', 'state': '850-FAILED'}],
+            [{'upid': 'p1', 'state': '500-RUNNING'}, {'upid': 'p2', 'state': '800-EXITED'},
+             {'upid': 'p3', 'state': '500-RUNNING'}],
+        ]
+        opts = Mock(process_ids=['p1', 'p2', 'p3'], process_id_file=None, max=5, poll=0.01, max_poll=0.01)
+        with patch('ceiclient.commands.sys.stderr'):
+            processes = PDWaitProcess.execute(client, opts)
+        assert [p['upid'] for p in processes] == ['p1', 'p2', 'p3']
+        assert not client.describe_process.called
+
+    def test_wait_many_duplicates(self):
+        client = Mock()
+        client.describe_processes.return_value = [
+            {'upid': 'p1', 'state': '500-RUNNING'}, {'upid': 'p2', 'state': '500-RUNNING'}]
+        fd, path = tempfile.mkstemp()
+        os.write(fd, "p2\np1\n")
+        os.close(fd)
+        opts = Mock(process_ids=['p1', 'p2', 'p1'], process_id_file=path, max=5, poll=0.01, max_poll=0.01)
+        with patch('ceiclient.commands.sys.stderr') as stderr:
+            processes = PDWaitProcess.execute(client, opts)
+        os.remove(path)
+        assert [p['upid'] for p in processes] == ['p1', 'p2']
+        stderr.write.assert_called_once_with("2 ready, 0 failed, 0 pending\n")
+
+    def test_wait_many_failures(self):
+        client = Mock()
+        client.describe_processes.return_value = [
+            {'upid': 'p1', 'state': '500-RUNNING'}, {'upid': 'p2', 'state': '900-REJECTED'}]
+        fd, path = tempfile.mkstemp()
+        os.write(fd, "# deploy\np1\n\np2\n")
+        os.close(fd)
+        opts = Mock(process_ids=[], process_id_file=path, max=5, poll=0.01, max_poll=0.01)
+        try:
+            with patch('ceiclient.commands.sys.stderr'):
+                PDWaitProcess.execute(client, opts)
+        except CeiClientError as e:
+            assert str(e) == "1 of 2 processes FAILED: p2 (900-REJECTED)"
+        else:
+            assert False, "expected CeiClientError"
+        finally:
+            os.remove(path)
+
+    def test_wait_many_timeout(self):
+        client = Mock()
+        client.describe_processes.return_value = [{'upid': 'p1', 'state': '500-RUNNING'}]
+        opts = Mock(process_ids=['p1', 'p2'], process_id_file=None, max=0.03, poll=0.01, max_poll=0.01)
+        try:
+            with patch('ceiclient.commands.sys.stderr'):
+                PDWaitProcess.execute(client, opts)
+        except CeiClientError as e:
+            assert str(e) == "Timed out waiting for 1 of 2 processes: p2"
+        else:
+            assert False, "expected CeiClientError"
+
+
+class TestScheduleBatch:
+
+    manifest = """
+processes:
+  - definition_name: sleeper
+    count: 3
+  - id: special
+    definition_id: def2
+    configuration: {a: 1}
+"""
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.yml')
+        os.write(fd, self.manifest)
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def opts(self, **kwargs):
+        opts = dict(manifest=self.path, max_in_flight=2, wait=False, max=5, poll=0.01, max_poll=0.01)
+        opts.update(kwargs)
+        return Mock(**opts)
+
+    def test_schedule_batch(self):
+        def schedule(upid, **kwargs):
+            if kwargs['process_definition_id'] == 'def2':
+                raise Exception("no such definition")
+        client = Mock()
+        client.schedule_process.side_effect = schedule
+
+        result = PDScheduleProcessBatch.execute(client, self.opts())
+
+        assert client.schedule_process.call_count == 4
+        assert len(set(row['upid'] for row in result)) == 4
+        assert [row['state'] for row in result] == ["SCHEDULED"] * 3 + ["FAILED: no such definition"]
+        assert result[3]['upid'] == 'special'
+        assert PDScheduleProcessBatch.failed(result) == "1 of 4 processes failed: special"
+
+    def test_schedule_batch_wait(self):
+        client = Mock()
+        client.describe_processes.side_effect = lambda: [
+            {'upid': call[0][0], 'state': '500-RUNNING'}
+            for call in client.schedule_process.call_args_list]
+
+        with patch('ceiclient.commands.sys.stderr'):
+            result = PDScheduleProcessBatch.execute(client, self.opts(wait=True))
+        assert [row['state'] for row in result] == ['500-RUNNING'] * 4
+        assert PDScheduleProcessBatch.failed(result) is None
+
+    def test_schedule_batch_wait_gateway_states(self):
+        client = Mock()
+        client.describe_processes.side_effect = lambda: [
+            {'process_id': call[0][0], 'process_state': 3 if i else 42}
+            for i, call in enumerate(client.schedule_process.call_args_list)]
+
+        with patch('ceiclient.commands.sys.stderr'):
+            result = PDScheduleProcessBatch.execute(client, self.opts(wait=True, max=0.03))
+        assert [row['state'] for row in result] == [None] + ['400-PENDING'] * 3
+        assert PDScheduleProcessBatch.failed(result).startswith("Timed out waiting for 4 of 4 processes")
+
+    def test_schedule_batch_wait_error(self):
+        from ceiclient.exception import CeiConnectionError
+        client = Mock()
+        client.describe_processes.side_effect = CeiConnectionError("timed out")
+
+        result = PDScheduleProcessBatch.execute(client, self.opts(wait=True))
+        assert [row['state'] for row in result] == ["SCHEDULED"] * 4
+        assert not any(row.get('timed_out') for row in result)
+        assert PDScheduleProcessBatch.failed(result) == \
+            "Stopped waiting for 4 of 4 processes: timed out"
+
+    def test_schedule_batch_wait_timeout(self):
+        client = Mock()
+        client.describe_processes.side_effect = lambda: [
+            {'upid': call[0][0], 'state': '500-RUNNING' if i % 2 else '400-PENDING'}
+            for i, call in enumerate(client.schedule_process.call_args_list)]
+
+        with patch('ceiclient.commands.sys.stderr'):
+            result = PDScheduleProcessBatch.execute(client, self.opts(wait=True, max=0.03))
+        assert [row['state'] for row in result] == ['400-PENDING', '500-RUNNING'] * 2
+        pending = [row['upid'] for row in result if row['state'] == '400-PENDING']
+        assert PDScheduleProcessBatch.failed(result) == \
+            "Timed out waiting for 2 of 4 processes: %s" % ", ".join(pending)
+
+    def check_bad_manifest(self, content):
+        with open(self.path, 'w') as f:
+            f.write(content)
+        client = Mock()
+        try:
+            PDScheduleProcessBatch.execute(client, self.opts())
+        except CeiClientError:
+            pass
+        else:
+            assert False, "expected CeiClientError"
+        assert not client.schedule_process.called
+
+    def test_schedule_batch_bad_manifest(self):
+        self.check_bad_manifest("- {count: 2}\n")
+        self.check_bad_manifest("- {definition_id: d, count: 0}\n")
+        self.check_bad_manifest("- {definition_id: d, count: '2'}\n")
+        self.check_bad_manifest("- {definition_id: d, count: true}\n")
+        self.check_bad_manifest("- {id: p1, definition_id: d}\n- {id: p1, definition_id: e}\n")
+
+
+class TestProcessFilters:
+
+    def setUp(self):
+        self.parser = argparse.ArgumentParser()
+        self.subparsers = self.parser.add_subparsers(dest='command')
+        PDDescribeProcesses(self.subparsers)
+        self.client = Mock()
+        self.client.iter_processes.side_effect = lambda: iter(self.processes)
+        self.processes = [
+            {'upid': 'p1', 'name': 'web-1', 'state': '500-RUNNING',
+                'definition': {'definition_id': 'web'}, 'constraints': {'engine': 'small'}},
+            {'upid': 'p2', 'name': 'web-2', 'state': '1000-CUSTOM',
+                'definition': {'definition_id': 'web'}, 'constraints': None},
+            {'upid': 'p3', 'name': 'db-1', 'state': '200-REQUESTED',
+                'definition_id': 'db', 'constraints': {'engine': 'large'}},
+            {'upid': 'p4', 'name': None, 'state': '700-TERMINATED'},
+        ]
+
+    def upids(self, argv):
+        opts = self.parser.parse_args(['list'] + argv)
+        return [p.get('upid') or p['process_id'] for p in PDDescribeProcesses.execute(self.client, opts)]
+
+    def test_no_filters(self):
+        assert self.upids([]) == ['p1', 'p2', 'p3', 'p4']
+
+    def test_state_range_is_numeric(self):
+        assert self.upids(['--state-min', '500']) == ['p1', 'p2', 'p4']
+        assert self.upids(['--state-max', 'running']) == ['p1', 'p3']
+        assert self.upids(['--state-min', 'REQUESTED', '--state-max', '500-RUNNING']) == ['p1', 'p3']
+
+    @raises(SystemExit)
+    def test_unknown_state(self):
+        self.parser.parse_args(['list', '--state-min', 'SLEEPING'])
+
+    def test_name_definition_engine(self):
+        assert self.upids(['--name-prefix', 'web']) == ['p1', 'p2']
+        assert self.upids(['--definition', 'db']) == ['p3']
+        assert self.upids(['--definition', 'web', '--engine', 'small']) == ['p1']
+
+    def test_ha_list(self):
+        self.processes = [
+            {'upid': 'h1', 'name': 'haagent-1', 'state': '500-RUNNING'},
+            {'upid': 'h2', 'name': 'haagent-2', 'state': '700-TERMINATED'},
+            {'upid': 'h3', 'name': 'haagent-3', 'state': '1000-CUSTOM'},
+            {'upid': 'p1', 'name': 'web-1', 'state': '500-RUNNING'},
+        ]
+        assert [p['upid'] for p in HAList.execute(self.client, None)] == ['h1']
+
+    def test_gateway_processes(self):
+        # processes from the service gateway have an integer process_state
+        self.processes = [
+            {'process_id': 'g1', 'name': 'haagent-1', 'process_state': 4,
+                'process_definition_id': 'ha', 'process_configuration': {'a': 1}},
+            {'process_id': 'g2', 'name': 'web-1', 'process_state': 1},
+            {'process_id': 'g3', 'name': 'haagent-2', 'process_state': 6},
+        ]
+        assert self.upids(['--state-min', '500']) == ['g1', 'g3']
+        assert self.upids(['--state-max', 'PENDING']) == ['g2']
+        assert self.upids(['--definition', 'ha']) == ['g1']
+
+        agents = HAList.execute(self.client, None)
+        assert [(p['upid'], p['state']) for p in agents] == [('g1', '500-RUNNING')]
+        assert agents[0]['configuration'] == {'a': 1}
+
+
+def test_templates_compiled_once():
+    from ceiclient.commands import _template
+    source = 'Process ID = {{ result.upid }}'
+    template = _template(source)
+    assert _template(source) is template
+    assert template.render(result={'upid': 'p1'}) == 'Process ID = p1'
+
+
+class TestLoadProcessDefinitions:
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, filename, content):
+        path = os.path.join(self.tmpdir, filename)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def write_specs(self, count):
+        return [self.write("w%d.yml" % i, "name: w%d\nexecutable:\n  exec: /bin/true\n" % i)
+                for i in range(count)]
+
+    def test_parallel_load_keeps_order(self):
+        from ceiclient.commands import PARALLEL_LOAD_MIN_FILES, _load_process_definitions
+        paths = self.write_specs(PARALLEL_LOAD_MIN_FILES + 8)
+        definitions = _load_process_definitions(paths, processes=2)
+        assert [d['name'] for d in definitions] == ["w%d" % i for i in range(len(paths))]
+
+    def test_all_problems_reported(self):
+        from ceiclient.commands import PARALLEL_LOAD_MIN_FILES, _load_process_definitions
+        paths = self.write_specs(PARALLEL_LOAD_MIN_FILES)
+        paths.append(self.write("noexec.yml", "name: noexec\n"))
+        paths.append(self.write("broken.yml", "name: [unclosed\n"))
+        paths.append(self.write("dup.yml", "name: w3\nexecutable:\n  exec: /bin/true\n"))
+
+        for processes in (2, 1):
+            try:
+                _load_process_definitions(paths, processes=processes)
+            except CeiClientError as e:
+                message = str(e)
+            else:
+                assert False, "expected CeiClientError"
+            assert message.startswith("3 problems")
+            assert "noexec.yml: definition has missing or invalid executable" in message
+            assert "broken.yml" in message
+            assert "'w3' found in multiple definitions! (%s and %s)" % (paths[3], paths[-1]) in message
+
+    def test_single_problem(self):
+        from ceiclient.commands import _load_process_definitions
+        path = self.write("noname.yml", "executable:\n  exec: /bin/true\n")
+        try:
+            _load_process_definitions([path])
+        except CeiClientError as e:
+            assert str(e) == "Problem reading process specification file %s: definition missing name" % path
+        else:
+            assert False, "expected CeiClientError"
+
+    def test_single_duplicate(self):
+        from ceiclient.commands import _load_process_definitions
+        paths = self.write_specs(2)
+        paths.append(self.write("dup.yml", "name: w0\nexecutable:\n  exec: /bin/true\n"))
+        try:
+            _load_process_definitions(paths)
+        except CeiClientError as e:
+            assert str(e) == "Process definition name 'w0' found in multiple definitions!"
+        else:
+            assert False, "expected CeiClientError"
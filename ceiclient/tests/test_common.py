@@ -1,6 +1,61 @@
+import os
+import shutil
+import stat
+import tempfile
+import time
+
+from mock import patch
+
 import ceiclient.common
 
 #class TestCloudInitD:
 #
 #    def test_cloudinitd_load(self):
 #        ceiclient.common.load()
+
+
+class TestCloudInitDCache:
+
+    def setup(self):
+        self.home = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.home, '.cloudinitd'))
+        self.db_path = os.path.join(self.home, '.cloudinitd', 'cloudinitd-run1.db')
+        self.cache_path = os.path.join(self.home, '.cloudinitd', 'ceiclient-run1.json')
+        with open(self.db_path, 'w') as f:
+            f.write('db')
+        self.vars = {'rabbitmq_host': 'broker', 'rabbitmq_password': 'secret', 'gateway_port': 5001}
+        self.environ = patch.dict(os.environ, {'HOME': self.home})
+        self.environ.start()
+
+    def teardown(self):
+        self.environ.stop()
+        shutil.rmtree(self.home)
+
+    def test_settings_are_cached_until_db_changes(self):
+        with patch('ceiclient.common._load_cloudinitd_vars', return_value=self.vars) as load:
+            assert ceiclient.common.load_cloudinitd_db('run1') == self.vars
+            assert ceiclient.common.load_cloudinitd_db('run1') == self.vars
+            assert load.call_count == 1
+
+            assert stat.S_IMODE(os.stat(self.cache_path).st_mode) == 0600
+            assert isinstance(ceiclient.common.load_cloudinitd_db('run1')['rabbitmq_host'], str)
+
+            mtime = time.time() + 10
+            os.utime(self.db_path, (mtime, mtime))
+            ceiclient.common.load_cloudinitd_db('run1')
+            assert load.call_count == 2
+
+    def test_no_cache_without_db(self):
+        os.unlink(self.db_path)
+        with patch('ceiclient.common._load_cloudinitd_vars', return_value=self.vars) as load:
+            ceiclient.common.load_cloudinitd_db('run1')
+            ceiclient.common.load_cloudinitd_db('run1')
+            assert load.call_count == 2
+            assert not os.path.exists(self.cache_path)
+
+    def test_corrupt_cache_is_ignored(self):
+        with open(self.cache_path, 'w') as f:
+            f.write('{not json')
+        with patch('ceiclient.common._load_cloudinitd_vars', return_value=self.vars) as load:
+            assert ceiclient.common.load_cloudinitd_db('run1') == self.vars
+            assert load.call_count == 1
@@ -0,0 +1,102 @@
+import threading
+import time
+import unittest
+
+from ceiclient.concurrency import Future, FutureTimeout, WorkerPool, as_completed, gather
+
+
+class TestWorkerPool(unittest.TestCase):
+
+    def test_results_in_order(self):
+        with WorkerPool(4) as pool:
+            futures = pool.map(lambda x: x * 2, range(20))
+            self.assertEqual([f.result() for f in futures], range(0, 40, 2))
+
+    def test_exception_propagates(self):
+        def fail():
+            raise ValueError("nope")
+
+        with WorkerPool(2) as pool:
+            future = pool.submit(fail)
+            self.assertRaises(ValueError, future.result)
+            self.assertTrue(isinstance(future.exception(), ValueError))
+
+    def test_bounded_concurrency(self):
+        lock = threading.Lock()
+        running = [0]
+        peak = [0]
+
+        def work():
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.01)
+            with lock:
+                running[0] -= 1
+
+        with WorkerPool(3) as pool:
+            for future in [pool.submit(work) for _ in range(12)]:
+                future.result()
+        self.assertTrue(1 < peak[0] <= 3)
+
+    def test_submit_after_shutdown(self):
+        pool = WorkerPool(1)
+        pool.shutdown()
+        self.assertRaises(RuntimeError, pool.submit, lambda: None)
+
+
+class TestFuture(unittest.TestCase):
+
+    def test_result_timeout(self):
+        self.assertRaises(FutureTimeout, Future().result, 0.01)
+
+    def test_set_result(self):
+        future = Future()
+        self.assertFalse(future.done())
+        future.set_result(42)
+        self.assertTrue(future.done())
+        self.assertEqual(future.result(), 42)
+        self.assertEqual(future.exception(), None)
+
+    def test_done_callback(self):
+        seen = []
+        future = Future()
+        future.add_done_callback(seen.append)
+        self.assertEqual(seen, [])
+        future.set_result(1)
+        self.assertEqual(seen, [future])
+
+        # added after completion, it runs right away
+        future.add_done_callback(seen.append)
+        self.assertEqual(seen, [future, future])
+
+
+class TestCombinators(unittest.TestCase):
+
+    def test_gather(self):
+        futures = [Future() for _ in range(3)]
+        gathered = gather(futures)
+        for i, future in reversed(list(enumerate(futures))):
+            self.assertFalse(gathered.done())
+            future.set_result(i)
+        self.assertEqual(gathered.result(), [0, 1, 2])
+        self.assertEqual(gather([]).result(), [])
+
+    def test_gather_fails_with_first_exception(self):
+        with WorkerPool(2) as pool:
+            def fail():
+                raise ValueError("nope")
+            gathered = gather([pool.submit(lambda: 1), pool.submit(fail)])
+            self.assertRaises(ValueError, gathered.result, 5)
+
+    def test_as_completed(self):
+        first, second = Future(), Future()
+        completed = as_completed([first, second], timeout=5)
+        second.set_result(2)
+        self.assertTrue(next(completed) is second)
+        first.set_result(1)
+        self.assertTrue(next(completed) is first)
+
+    def test_as_completed_timeout(self):
+        completed = as_completed([Future()], timeout=0.01)
+        self.assertRaises(FutureTimeout, next, completed)
@@ -1,7 +1,11 @@
 from mock import Mock, patch
 import dashi
+import requests
+import socket
+import threading
 
-from ceiclient.connection import DashiCeiConnection
+from ceiclient.connection import DashiCeiConnection, PyonHTTPGateWayCeiConnection
+from ceiclient.exception import CeiClientError
 
 def test_set_up_dashi_cei_connection():
     server = 'localhost'
@@ -13,3 +17,160 @@ def test_set_up_dashi_cei_connection():
         mock.assert_called_with('ceiclient', 'amqp://%s:%s@%s:5672//' %
                 (username, password, server), dashi.bootstrap.DEFAULT_EXCHANGE,
                 ssl=False, sysname=None)
+
+
+def test_gateway_connection_reuses_session():
+    with patch('ceiclient.connection.requests.Session') as session_class:
+        session = session_class.return_value
+        session.post.return_value.json.return_value = {
+            'data': {'GatewayResponse': 'ok'}}
+
+        conn = PyonHTTPGateWayCeiConnection('localhost', timeout=7)
+        assert conn.call('process_dispatcher', 'list_processes') == 'ok'
+        assert conn.call('process_dispatcher', 'list_processes') == 'ok'
+
+        session_class.assert_called_once_with()
+        assert session.post.call_count == 2
+        url, = session.post.call_args[0]
+        assert url == 'http://localhost:5001/ion-service/process_dispatcher/list_processes'
+        assert session.post.call_args[1]['timeout'] == 7
+
+
+def test_gateway_connection_evicts_idle_connections():
+    with patch('ceiclient.connection.requests.Session') as session_class:
+        session = session_class.return_value
+        session.post.return_value.json.return_value = {
+            'data': {'GatewayResponse': 'ok'}}
+
+        conn = PyonHTTPGateWayCeiConnection('localhost', pool_idle_timeout=30)
+        conn.call('process_dispatcher', 'list_processes')
+        assert not session.close.called
+
+        conn._last_used -= 31
+        conn.call('process_dispatcher', 'list_processes')
+        session.close.assert_called_once_with()
+
+
+def test_gateway_connection_keeps_connections_in_use():
+    with patch('ceiclient.connection.requests.Session') as session_class:
+        session = session_class.return_value
+        started = threading.Event()
+        release = threading.Event()
+
+        def post(url, data, timeout):
+            if url.endswith('read_process'):
+                started.set()
+                release.wait(5)
+            response = Mock()
+            response.json.return_value = {'data': {'GatewayResponse': 'ok'}}
+            return response
+        session.post.side_effect = post
+
+        conn = PyonHTTPGateWayCeiConnection('localhost', pool_idle_timeout=30)
+        future = conn.call_async('process_dispatcher', 'read_process')
+        assert started.wait(5)
+        # the session's pool is in use by the call above, so it isn't closed
+        conn._last_used -= 31
+        conn.call('process_dispatcher', 'list_processes')
+        assert not session.close.called
+
+        release.set()
+        assert future.result(5) == 'ok'
+        conn._last_used -= 31
+        conn.call('process_dispatcher', 'list_processes')
+        session.close.assert_called_once_with()
+        conn.disconnect()
+
+
+def test_gateway_connection_timeout():
+    with patch('ceiclient.connection.requests.Session') as session_class:
+        session = session_class.return_value
+        session.post.side_effect = requests.exceptions.Timeout()
+
+        conn = PyonHTTPGateWayCeiConnection('localhost', timeout=1)
+        try:
+            conn.call('process_dispatcher', 'list_processes')
+        except CeiClientError as e:
+            assert str(e) == "timed out"
+        else:
+            assert False, "expected CeiClientError"
+
+
+def test_dashi_connection_per_thread():
+    with patch('ceiclient.connection.DashiConnection') as mock:
+        conn = DashiCeiConnection('localhost', 'guest', 'guest')
+        assert conn._thread_connection() is conn.dashi_connection
+        assert mock.call_count == 1
+
+        seen = []
+        thread = threading.Thread(target=lambda: seen.append(conn._thread_connection()))
+        thread.start()
+        thread.join()
+        assert mock.call_count == 2
+
+        conn.disconnect()
+        assert seen[0].disconnect.called
+
+
+def test_dashi_subscription():
+    with patch('ceiclient.connection.DashiConnection') as mock:
+        conn = DashiCeiConnection('localhost', 'guest', 'guest')
+        subscription = conn.subscribe('process_state')
+
+        assert subscription.name.startswith('ceiclient_')
+        assert mock.call_args[0][0] == subscription.name
+        sub_dashi = mock.return_value
+        handler, operation = sub_dashi.handle.call_args[0]
+        assert operation == 'process_state'
+
+        sub_dashi.consume.side_effect = lambda count, timeout: handler(process={'upid': 'p1'})
+        assert subscription.receive(1) == {'process': {'upid': 'p1'}}
+
+        sub_dashi.consume.side_effect = socket.timeout()
+        assert subscription.receive(1) is None
+
+        subscription.close()
+        assert sub_dashi.disconnect.called
+
+
+def test_gateway_call_async_in_flight():
+    with patch('ceiclient.connection.requests.Session') as session_class:
+        session = session_class.return_value
+        started = threading.Semaphore(0)
+        release = threading.Event()
+
+        def post(url, data, timeout):
+            started.release()
+            release.wait(5)
+            response = Mock()
+            response.json.return_value = {'data': {'GatewayResponse': url.rsplit('/', 1)[-1]}}
+            return response
+        session.post.side_effect = post
+
+        conn = PyonHTTPGateWayCeiConnection('localhost')
+        futures = [conn.call_async('process_dispatcher', op)
+                for op in ('read_process', 'list_processes')]
+        # both calls are waiting on their replies at the same time
+        started.acquire()
+        started.acquire()
+        assert not any(future.done() for future in futures)
+
+        release.set()
+        assert [future.result(5) for future in futures] == ['read_process', 'list_processes']
+        conn.disconnect()
+
+
+def test_dashi_call_async_uses_worker_connection():
+    with patch('ceiclient.connection.DashiConnection') as mock:
+        conn = DashiCeiConnection('localhost', 'guest', 'guest', timeout=3)
+        mock.return_value.call.return_value = 'ok'
+
+        assert conn.call_async('process_dispatcher', 'describe_processes').result(5) == 'ok'
+        mock.return_value.call.assert_called_once_with('process_dispatcher',
+                'describe_processes', 3)
+        assert mock.call_count == 2
+
+        mock.return_value.call.side_effect = socket.timeout()
+        future = conn.call_async('process_dispatcher', 'describe_processes')
+        assert isinstance(future.exception(5), CeiClientError)
+        conn.disconnect()
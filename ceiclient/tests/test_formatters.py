@@ -0,0 +1,68 @@
+import json
+import unittest
+
+from StringIO import StringIO
+
+from ceiclient.formatters import DOMAIN_COLUMNS, PROCESS_COLUMNS, format_ndjson, format_rows, \
+        write_chunked, write_rows
+
+PROCESSES = [
+    {'upid': 'p1', 'name': 'web', 'state': '500-RUNNING', 'hostname': 'vm1', 'assigned': 'ee1'},
+    {'process_id': 'p2', 'name': u'caf\xe9\tbar', 'state': '200-REQUESTED', 'hostname': None},
+]
+
+
+class TestFormatters(unittest.TestCase):
+
+    def test_table(self):
+        out = StringIO()
+        write_rows(iter(PROCESSES), PROCESS_COLUMNS, 'table', out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0].split(), ['UPID', 'NAME', 'STATE', 'HOSTNAME', 'ASSIGNED'])
+        self.assertEqual(lines[1].split(), ['p1', 'web', '500-RUNNING', 'vm1', 'ee1'])
+        self.assertEqual(lines[1].index('web'), 38)
+        self.assertTrue(lines[2].startswith('p2 '))
+
+    def test_tsv(self):
+        lines = ''.join(format_rows(PROCESSES, PROCESS_COLUMNS, 'tsv')).splitlines()
+        self.assertEqual(lines[0], 'upid\tname\tstate\thostname\tassigned')
+        self.assertEqual(lines[2].split('\t'), ['p2', 'caf\xc3\xa9\\tbar', '200-REQUESTED', '', ''])
+
+    def test_gateway_rows(self):
+        gateway = {'process_id': 'g1', 'name': 'web', 'process_state': 4,
+            'detail': {'hostname': 'vm2', 'assigned': 'ee2'}}
+        lines = ''.join(format_rows([gateway], PROCESS_COLUMNS, 'tsv')).splitlines()
+        self.assertEqual(lines[1].split('\t'), ['g1', 'web', '500-RUNNING', 'vm2', 'ee2'])
+
+    def test_ndjson(self):
+        lines = list(format_rows(PROCESSES, PROCESS_COLUMNS, 'ndjson'))
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(json.loads(lines[1])['upid'], 'p2')
+        self.assertEqual(json.loads(lines[1])['hostname'], None)
+
+    def test_ndjson_whole_objects(self):
+        def processes():
+            for process in PROCESSES:
+                yield process
+        lines = format_ndjson(processes())
+        self.assertEqual(json.loads(next(lines)), PROCESSES[0])
+        self.assertEqual(json.loads(next(lines))['process_id'], 'p2')
+        self.assertEqual(list(lines), [])
+
+        self.assertEqual(list(format_ndjson({'status': 'READY'})), ['{"status":"READY"}\n'])
+
+    def test_plain_names(self):
+        lines = list(format_rows(['domain1', 'domain2'], DOMAIN_COLUMNS, 'tsv'))
+        self.assertEqual(lines, ['domain_id\n', 'domain1\n', 'domain2\n'])
+
+    def test_chunked_writes(self):
+        class Recorder(object):
+            def __init__(self):
+                self.writes = []
+            def write(self, data):
+                self.writes.append(data)
+            def flush(self):
+                pass
+        recorder = Recorder()
+        write_chunked(('x' * 10 for _ in range(25)), recorder, chunk_size=100)
+        self.assertEqual([len(w) for w in recorder.writes], [100, 100, 50])
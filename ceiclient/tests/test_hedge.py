@@ -0,0 +1,65 @@
+import threading
+import unittest
+
+from ceiclient.connection import CeiConnection
+from ceiclient.exception import CeiClientError
+from ceiclient.hedge import HedgingConnection
+from ceiclient.retry import NO_RETRY
+
+
+class SlowFirstConnection(CeiConnection):
+    """Replies to every request but the first one right away
+    """
+
+    retry_policy = NO_RETRY
+
+    def __init__(self):
+        self.calls = 0
+        self.lock = threading.Lock()
+        self.release = threading.Event()
+
+    def _call(self, service, operation, **kwargs):
+        with self.lock:
+            self.calls += 1
+            attempt = self.calls
+        if attempt == 1:
+            self.release.wait(5)
+            return 'slow'
+        if operation == 'fail':
+            raise CeiClientError("failed")
+        return 'fast'
+
+
+class TestHedgingConnection(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = SlowFirstConnection()
+        self.hedging = HedgingConnection(self.conn, operations=('describe_process', 'describe_domain'),
+                initial_delay=0.01, min_samples=3)
+
+    def tearDown(self):
+        self.conn.release.set()
+        self.hedging.disconnect()
+
+    def test_slow_read_is_hedged(self):
+        self.assertEqual(self.hedging.call('process_dispatcher', 'describe_process', upid='p1'), 'fast')
+        self.assertEqual(self.conn.calls, 2)
+        self.assertEqual(self.hedging.hedged, 1)
+
+    def test_other_operations_are_not_hedged(self):
+        self.conn.release.set()
+        self.assertEqual(self.hedging.call('process_dispatcher', 'terminate_process', upid='p1'), 'slow')
+        self.assertEqual(self.conn.calls, 1)
+
+    def test_first_success_wins(self):
+        self.conn.release.set()
+        self.conn.calls = 1
+        self.assertEqual(self.hedging.call('epum', 'describe_domain'), 'fast')
+
+    def test_delay_from_percentile(self):
+        self.assertEqual(self.hedging.delay('pd', 'describe_process'), 0.01)
+        self.hedging._durations[('pd', 'describe_process')] = [0.2, 0.1, 0.3]
+        self.assertEqual(self.hedging.delay('pd', 'describe_process'), 0.3)
+
+    def test_writes_cannot_be_hedged(self):
+        self.assertRaises(ValueError, HedgingConnection, self.conn, operations=('schedule_process',))
@@ -0,0 +1,116 @@
+import unittest
+
+from StringIO import StringIO
+
+from mock import patch
+
+from ceiclient.cli import print_timings
+from ceiclient.connection import CeiConnection, PyonHTTPGateWayCeiConnection
+from ceiclient.exception import CeiClientError
+from ceiclient.instrumentation import HistogramCollector, Instrument, percentile, record_retry
+
+
+class RecordingInstrument(Instrument):
+
+    def __init__(self):
+        self.events = []
+
+    def before_call(self, record):
+        self.events.append(('before', record.operation, record.duration))
+
+    def after_call(self, record):
+        self.events.append(('after', record.operation, record.retries))
+
+    def on_error(self, record):
+        self.events.append(('error', record.operation, str(record.error)))
+
+    def on_retry(self, record):
+        self.events.append(('retry', record.operation, record.retries))
+
+
+class FlakyConnection(CeiConnection):
+
+    def _call(self, service, operation, **kwargs):
+        if operation == 'fail':
+            raise CeiClientError("down")
+        if operation == 'retry':
+            record_retry(self.instruments, CeiClientError("once"))
+        return kwargs
+
+
+class TestInstruments(unittest.TestCase):
+
+    def test_hooks(self):
+        conn = FlakyConnection()
+        instrument = RecordingInstrument()
+        conn.add_instrument(instrument)
+
+        self.assertEqual(conn.call('pd', 'describe', upid='p1'), {'upid': 'p1'})
+        conn.call('pd', 'retry')
+        self.assertRaises(CeiClientError, conn.call, 'pd', 'fail')
+
+        self.assertEqual(instrument.events, [
+            ('before', 'describe', None), ('after', 'describe', 0),
+            ('before', 'retry', None), ('retry', 'retry', 1), ('after', 'retry', 1),
+            ('before', 'fail', None), ('error', 'fail', 'down')])
+
+    def test_request_size(self):
+        conn = FlakyConnection()
+        sizes = []
+        instrument = Instrument()
+        instrument.after_call = lambda record: sizes.append(record.request_size)
+        conn.add_instrument(instrument)
+        conn.call('pd', 'describe', upid='p1')
+        self.assertEqual(sizes, [len('{"upid": "p1"}')])
+
+    def test_response_size(self):
+        conn = FlakyConnection()
+        sizes = []
+        instrument = Instrument()
+        instrument.before_call = lambda record: sizes.append(record.response_size)
+        instrument.after_call = lambda record: sizes.append(record.response_size)
+        instrument.on_error = lambda record: sizes.append(record.response_size)
+        conn.add_instrument(instrument)
+        conn.call('pd', 'list', processes=[{'upid': 'p1'}, {'upid': 'p2'}])
+        conn.call('pd', 'retry')
+        self.assertRaises(CeiClientError, conn.call, 'pd', 'fail')
+        self.assertEqual(sizes, [None, len('{"processes": [{"upid": "p1"}, {"upid": "p2"}]}'),
+            None, len('{}'), None, None])
+
+    def test_gateway_is_instrumented(self):
+        with patch('ceiclient.connection.requests.Session') as session_class:
+            session_class.return_value.post.return_value.json.return_value = {
+                'data': {'GatewayResponse': 'ok'}}
+            conn = PyonHTTPGateWayCeiConnection('localhost')
+            collector = HistogramCollector()
+            conn.add_instrument(collector)
+            conn.call('process_dispatcher', 'list_processes')
+            self.assertEqual(len(collector.durations('process_dispatcher', 'list_processes')), 1)
+
+
+class TestHistogramCollector(unittest.TestCase):
+
+    def test_percentile(self):
+        ordered = range(1, 101)
+        self.assertEqual(percentile(ordered, 50), 50)
+        self.assertEqual(percentile(ordered, 99), 99)
+        self.assertEqual(percentile([3], 95), 3)
+        self.assertEqual(percentile([], 50), None)
+
+    def test_summary(self):
+        conn = FlakyConnection()
+        collector = HistogramCollector()
+        conn.add_instrument(collector)
+        for _ in range(3):
+            conn.call('pd', 'describe')
+        self.assertRaises(CeiClientError, conn.call, 'pd', 'fail')
+
+        summary = collector.summary()
+        self.assertEqual([row[:4] for row in summary], [('pd', 'describe', 3, 0), ('pd', 'fail', 1, 1)])
+        self.assertEqual(len(summary[0][4]), 3)
+
+        out = StringIO()
+        print_timings(collector, out)
+        lines = out.getvalue().splitlines()
+        self.assertTrue(lines[0].startswith('SERVICE'))
+        self.assertEqual(lines[1].split()[:4], ['pd', 'describe', '3', '0'])
@@ -0,0 +1,81 @@
+import socket
+import unittest
+import urllib2
+
+from ceiclient.connection import CeiConnection
+from ceiclient.exception import CeiClientError
+from ceiclient.instrumentation import record_retry
+from ceiclient.metrics import PrometheusExporter, StatsdExporter
+
+
+class FlakyConnection(CeiConnection):
+
+    def _call(self, service, operation, **kwargs):
+        if operation == 'retry':
+            record_retry(self.instruments, CeiClientError("once"))
+        if operation == 'fail':
+            raise CeiClientError("down")
+        return 'ok'
+
+
+class TestStatsdExporter(unittest.TestCase):
+
+    def setUp(self):
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.settimeout(5)
+        self.exporter = StatsdExporter('127.0.0.1', self.listener.getsockname()[1])
+        self.conn = FlakyConnection()
+        self.conn.add_instrument(self.exporter)
+
+    def tearDown(self):
+        self.exporter.close()
+        self.listener.close()
+
+    def receive(self):
+        return self.listener.recv(65535).split('\n')
+
+    def test_calls_and_latency(self):
+        self.conn.call('process_dispatcher', 'describe_process')
+        calls, latency = self.receive()
+        self.assertEqual(calls, 'ceiclient.process_dispatcher.describe_process.calls:1|c')
+        self.assertTrue(latency.startswith('ceiclient.process_dispatcher.describe_process.latency:'))
+        self.assertTrue(latency.endswith('|ms'))
+
+    def test_errors_and_retries(self):
+        self.conn.call('pd', 'retry')
+        self.assertEqual(self.receive(), ['ceiclient.pd.retry.retries:1|c'])
+        self.receive()
+
+        self.assertRaises(CeiClientError, self.conn.call, 'pd', 'fail')
+        self.assertEqual(self.receive()[:2], ['ceiclient.pd.fail.calls:1|c', 'ceiclient.pd.fail.errors:1|c'])
+
+
+class TestPrometheusExporter(unittest.TestCase):
+
+    def setUp(self):
+        self.exporter = PrometheusExporter(buckets=(0.5, 10.0))
+        self.conn = FlakyConnection()
+        self.conn.add_instrument(self.exporter)
+
+    def tearDown(self):
+        self.exporter.close()
+
+    def test_render(self):
+        self.conn.call('pd', 'retry')
+        self.conn.call('pd', 'retry')
+        self.assertRaises(CeiClientError, self.conn.call, 'pd', 'fail')
+
+        text = self.exporter.render()
+        self.assertTrue('# TYPE ceiclient_calls_total counter' in text)
+        self.assertTrue('ceiclient_calls_total{service="pd",operation="retry"} 2' in text)
+        self.assertTrue('ceiclient_errors_total{service="pd",operation="fail"} 1' in text)
+        self.assertTrue('ceiclient_retries_total{service="pd",operation="retry"} 2' in text)
+        self.assertTrue('ceiclient_call_duration_seconds_bucket{service="pd",operation="retry",le="0.5"} 2' in text)
+        self.assertTrue('ceiclient_call_duration_seconds_count{service="pd",operation="fail"} 1' in text)
+
+    def test_serve(self):
+        self.conn.call('pd', 'describe')
+        port = self.exporter.serve(0, host='127.0.0.1')
+        body = urllib2.urlopen('http://127.0.0.1:%d/metrics' % port, timeout=5).read()
+        self.assertTrue('ceiclient_calls_total{service="pd",operation="describe"} 1' in body)
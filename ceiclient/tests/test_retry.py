@@ -0,0 +1,85 @@
+import unittest
+
+from mock import Mock, patch
+
+from ceiclient.connection import CeiConnection, PyonHTTPGateWayCeiConnection
+from ceiclient.exception import CeiClientError, CeiConnectionError
+from ceiclient.instrumentation import Instrument
+from ceiclient.retry import NO_RETRY, RetryPolicy, is_idempotent
+
+
+class FlakyConnection(CeiConnection):
+
+    def __init__(self, failures, error=CeiConnectionError("timed out"), retry_policy=None):
+        self.failures = failures
+        self.error = error
+        self.attempts = 0
+        if retry_policy is not None:
+            self.retry_policy = retry_policy
+
+    def _call(self, service, operation, **kwargs):
+        self.attempts += 1
+        if self.attempts <= self.failures:
+            raise self.error
+        return 'ok'
+
+
+@patch('ceiclient.retry.time.sleep', return_value=None)
+class TestRetryPolicy(unittest.TestCase):
+
+    def test_idempotent_operations(self, sleep):
+        for operation in ('describe_process', 'describe_processes', 'list_domains',
+                'read_process', 'status', 'dump'):
+            self.assertTrue(is_idempotent(operation), operation)
+        for operation in ('schedule_process', 'terminate_process', 'add_dt', 'reconfigure_domain'):
+            self.assertFalse(is_idempotent(operation), operation)
+
+    def test_reads_are_retried(self, sleep):
+        conn = FlakyConnection(2)
+        self.assertEqual(conn.call('pd', 'describe_process', upid='p1'), 'ok')
+        self.assertEqual(conn.attempts, 3)
+        self.assertEqual(sleep.call_count, 2)
+
+    def test_gives_up_after_max_attempts(self, sleep):
+        conn = FlakyConnection(5, retry_policy=RetryPolicy(max_attempts=2))
+        self.assertRaises(CeiConnectionError, conn.call, 'pd', 'describe_process')
+        self.assertEqual(conn.attempts, 2)
+
+    def test_writes_are_not_retried(self, sleep):
+        conn = FlakyConnection(1)
+        self.assertRaises(CeiConnectionError, conn.call, 'pd', 'schedule_process')
+        self.assertEqual(conn.attempts, 1)
+
+    def test_only_transient_errors_are_retried(self, sleep):
+        conn = FlakyConnection(1, error=CeiClientError("bad request"))
+        self.assertRaises(CeiClientError, conn.call, 'pd', 'describe_process')
+        self.assertEqual(conn.attempts, 1)
+
+    def test_deadline(self, sleep):
+        policy = RetryPolicy(max_attempts=10, initial=1.0, jitter=0, deadline=0.5)
+        conn = FlakyConnection(5, retry_policy=policy)
+        self.assertRaises(CeiConnectionError, conn.call, 'pd', 'describe_process')
+        self.assertEqual(conn.attempts, 1)
+
+    def test_no_retry(self, sleep):
+        conn = FlakyConnection(1, retry_policy=NO_RETRY)
+        self.assertRaises(CeiConnectionError, conn.call, 'pd', 'describe_process')
+
+    def test_retries_are_instrumented(self, sleep):
+        conn = FlakyConnection(2)
+        retries = []
+        instrument = Instrument()
+        instrument.on_retry = lambda record: retries.append(record.retries)
+        conn.add_instrument(instrument)
+        conn.call('pd', 'list_definitions')
+        self.assertEqual(retries, [1, 2])
+
+    def test_gateway_unavailable_is_retried(self, sleep):
+        with patch('ceiclient.connection.requests.Session') as session_class:
+            unavailable = Mock(status_code=503)
+            ok = Mock(status_code=200)
+            ok.json.return_value = {'data': {'GatewayResponse': 'ok'}}
+            session_class.return_value.post.side_effect = [unavailable, ok]
+
+            conn = PyonHTTPGateWayCeiConnection('localhost')
+            self.assertEqual(conn.call('process_dispatcher', 'read_process', process_id='p1'), 'ok')
@@ -0,0 +1,19 @@
+import unittest
+
+import yaml
+
+from ceiclient import yamlio
+
+
+class TestYamlIO(unittest.TestCase):
+
+    def test_round_trip(self):
+        data = {'name': 'worker', 'executable': {'exec': '/bin/true', 'argv': ['-v']}, 'slots': 2}
+        self.assertEqual(yamlio.load(yamlio.dump(data)), data)
+        self.assertEqual(yamlio.dump({'a': [1]}, default_flow_style=False), 'a:\n- 1\n')
+
+    def test_loading_is_safe(self):
+        self.assertRaises(yaml.YAMLError, yamlio.load, '!!python/object/apply:os.system ["true"]')
+
+    def test_uses_libyaml_when_available(self):
+        self.assertEqual(yamlio.using_libyaml(), yaml.__with_libyaml__)
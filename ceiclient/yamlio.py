@@ -0,0 +1,39 @@
+"""YAML reading and writing for ceiclient
+
+Everything goes through the safe loader and dumper, which only handle
+plain data, using the libyaml C implementations when PyYAML was built
+with them (they are many times faster on large files), and the pure
+Python ones otherwise. yaml is imported on first use, since most ceictl
+invocations never need it.
+"""
+
+_loader = None
+_dumper = None
+
+
+def _classes():
+    global _loader, _dumper
+    if _loader is None:
+        import yaml
+        _loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+        _dumper = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+    return _loader, _dumper
+
+
+def load(stream):
+    """Parse the YAML document in stream, a string or file
+    """
+    import yaml
+    return yaml.load(stream, Loader=_classes()[0])
+
+
+def dump(data, **kwargs):
+    """Return data as a YAML document; kwargs are those of yaml.dump
+    """
+    import yaml
+    return yaml.dump(data, Dumper=_classes()[1], **kwargs)
+
+
+def using_libyaml():
+    import yaml
+    return _classes()[0] is not yaml.SafeLoader